@@ -1,105 +1,49 @@
 import streamlit as st
 from simulator import Simulator
-from models import Product, InventoryItem, Order, BOMItem, Supplier, PurchaseOrder, Event
 import simpy
-from datetime import date, timedelta, datetime
-from collections import defaultdict
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import matplotlib.ticker as ticker
-
-import pandas as pd
+from datetime import date, datetime
 import json
+import math
 import os
-from utils.loader import cargar_configuracion
-
-# ===== Persistencia =====
-ESTADO_FILE = "./data/estado.json"
-def guardar_estado(sim):
-    estado = {
-        "day": sim.day,
-        "current_date": sim.current_date.isoformat(),
-        "inventory": sim.inventory,
-        "orders": [o.dict() | {"creation_date": o.creation_date.isoformat(),
-                       "delivery_date": o.delivery_date.isoformat() if o.delivery_date else None,
-                       "initial_quantity": o.initial_quantity}
-            for o in sim.orders],
-        "purchase_orders": [
-            po.dict() | {
-                "order_date": po.order_date.isoformat(),
-                "expected_arrival": po.expected_arrival.isoformat()
-            } for po in sim.purchase_orders
-        ],
-        "events": [e.dict() | {"sim_date": e.sim_date.isoformat()} for e in sim.events],
-        "inventory_history": [
-            {
-                "date": entry["date"].isoformat(),
-                "inventory": entry["inventory"]
-            }
-            for entry in sim.inventory_history
-        ],
-        "production_log": [
-            {
-                "date": log["date"].isoformat(),
-                "produced": log["produced"]
-            } for log in sim.production_log
-        ]
-    }
-    with open(ESTADO_FILE, "w", encoding="utf-8") as f:
-        json.dump(estado, f, indent=2, ensure_ascii=False)
+from utils.loader import cargar_configuracion, cargar_lineas
+from utils.estado import ESTADO_FILE, existe_estado, guardar_estado, bloquear_archivo, ServicioEstado
+from utils.worker import SimulationWorker
+from utils.graficos import series_por_producto, reducir_serie, dibujar_inventario
+from utils.consultas import (
+    necesita_sincronizar, consultar_pedidos, consultar_ordenes_compra, consultar_eventos
+)
 
-def cargar_estado(sim):
-    if os.path.exists(ESTADO_FILE) and os.path.getsize(ESTADO_FILE) > 0:
-        try:
-            with open(ESTADO_FILE, "r", encoding="utf-8") as f:
-                estado = json.load(f)
-            sim.day = estado["day"]
-            sim.current_date = datetime.fromisoformat(estado["current_date"]).date()
-            sim.inventory = {int(k): v for k, v in estado["inventory"].items()}
-            sim.orders = [Order(**{
-                **o,
-                "creation_date": datetime.fromisoformat(o["creation_date"]).date(),
-                "delivery_date": datetime.fromisoformat(o["delivery_date"]).date() if o.get("delivery_date") else None,
-                "initial_quantity": o.get("initial_quantity", o["quantity"])
-
-            }) for o in estado["orders"]]
-            sim.purchase_orders = [
-                PurchaseOrder(**{
-                    **po,
-                    "order_date": datetime.fromisoformat(po["order_date"]).date(),
-                    "expected_arrival": datetime.fromisoformat(po["expected_arrival"]).date()
-                }) for po in estado["purchase_orders"]
-            ]
-            sim.events = [Event(**{**e, "sim_date": datetime.fromisoformat(e["sim_date"]).date()}) for e in estado["events"]]
-            sim.inventory_history = [{
-                    "date": datetime.fromisoformat(entry["date"]).date(),
-                    "inventory": {int(k): v for k, v in entry["inventory"].items()}
-                }
-                for entry in estado.get("inventory_history", [])
-            ]
-            sim.production_log = [
-                {
-                    "date": datetime.fromisoformat(log["date"]).date(),
-                    "produced": log.get("produced", {})
-                } for log in estado.get("production_log", [])
-            ]
-        except json.JSONDecodeError:
-            st.warning("El archivo estado.json está vacío o corrupto. Se cargará un estado inicial.")
+# pandas y matplotlib son las importaciones más lentas del dashboard: se cargan
+# dentro de cada panel, sólo cuando el usuario lo abre.
 
 # ===== Simulación inicial =====
-env = simpy.Environment()
-sim = Simulator(env)  
+@st.cache_resource
+def cargar_catalogo():
+    # El catálogo no cambia entre ejecuciones: se lee una sola vez por proceso
+    return cargar_configuracion(), cargar_lineas()
+
+@st.cache_resource
+def obtener_lector():
+    # Acceso de sólo lectura al estado, compartido por todas las sesiones
+    return ServicioEstado()
+
+@st.cache_resource
+def obtener_worker():
+    # Un único worker por proceso de Streamlit, compartido por todas las sesiones
+    return SimulationWorker().iniciar()
+
 st.set_page_config(layout="wide")
 
-# 1. Cargar configuración
-products, boms, suppliers = cargar_configuracion()
-sim.products = products
-sim.boms = boms
-sim.suppliers = suppliers
+def simulador_con_catalogo():
+    sim = Simulator(simpy.Environment())
+    (sim.products, sim.boms, sim.suppliers), sim.lines = cargar_catalogo()
+    return sim
 
-# 2. Si no existe estado, lo inicializamos y guardamos
-if not os.path.exists(ESTADO_FILE) or os.path.getsize(ESTADO_FILE) == 0:
+# 1. Si no existe estado, lo inicializamos y guardamos (bajo bloqueo: otra
+#    sesión podría estar haciendo lo mismo)
+def inicializar_estado():
     import random
+    sim = simulador_con_catalogo()
     sim.day = 1
     sim.current_date = date.today()
 
@@ -110,119 +54,134 @@ if not os.path.exists(ESTADO_FILE) or os.path.getsize(ESTADO_FILE) == 0:
         if product.type == "raw"
     }
 
-    # Obtener IDs de productos terminados
-    productos_finales = [p.id for p in sim.products if p.type == "finished"]
-
     # Crear dos órdenes iniciales con productos y cantidades aleatorias
     sim.generar_pedidos()
     sim.generar_pedidos()
 
     guardar_estado(sim)
 
+if not existe_estado():
+    with bloquear_archivo(f"{ESTADO_FILE}.lock"):
+        if not existe_estado():
+            inicializar_estado()
 
-# 3. Cargar estado una única vez, después de posible inicialización
-cargar_estado(sim)
-
-# ===== Lógica MRP =====
-def calcular_faltantes():
-    requerimientos = defaultdict(int)
-
-    # Paso 1: sumar materiales requeridos por pedidos pendientes
-    for order in sim.orders:
-        if order.status == "pending":
-            for bom in sim.boms:
-                if bom.finished_product_id == order.product_id:
-                    requerimientos[bom.material_id] += bom.quantity * order.quantity
-
-    # Paso 2: restar materiales que ya están comprometidos en pedidos liberados
-    reservas = defaultdict(int)
-    for order in sim.orders:
-        if order.status == "released":
-            for bom in sim.boms:
-                if bom.finished_product_id == order.product_id:
-                    reservas[bom.material_id] += bom.quantity * order.quantity
-
-    # Paso 3: calcular faltantes reales
-    faltantes = {}
-    for pid, req_qty in requerimientos.items():
-        en_stock = sim.inventory.get(pid, 0)
-        reservado = reservas.get(pid, 0)
-        disponible = en_stock - reservado
-
-        if req_qty > disponible:
-            faltantes[pid] = req_qty - disponible
-
-    return faltantes
-
-def calcular_faltantes_by_order(order):
-    # Copiamos el inventario actual
-    inventario_disponible = sim.inventory.copy()
-
-    # Reservamos materiales para pedidos ya liberados (que aún no se han completado)
-    for o in sim.orders:
-        if o.status == "released" and o.id != order.id:
-            for bom in sim.boms:
-                if bom.finished_product_id == o.product_id:
-                    inventario_disponible[bom.material_id] -= bom.quantity * o.quantity
-
-    # Requerimientos del pedido actual
-    requerimientos = defaultdict(int)
-    for bom in sim.boms:
-        if bom.finished_product_id == order.product_id:
-            requerimientos[bom.material_id] += bom.quantity * order.quantity
 
-    # Calcular faltantes reales
-    faltantes = {}
-    for pid, req_qty in requerimientos.items():
-        en_stock = inventario_disponible.get(pid, 0)
-        if req_qty > en_stock:
-            faltantes[pid] = req_qty - en_stock
-
-    return faltantes
-
-
-# ===== Encabezado =====
-st.title("Simulador MRP - Producción Impresoras 3D")
-st.subheader(f"Día simulado: {sim.day} ({sim.current_date})")
-
-# Inicializar valores por defecto si no existen
-if "media" not in st.session_state:
-    st.session_state["media"] = 5
-if "desviacion" not in st.session_state:
-    st.session_state["desviacion"] = 2
-
-# Configuración avanzada
-with st.expander("⚙️ Configuración avanzada de generación de pedidos"):
-    st.session_state["media"] = st.slider("Media de pedidos diarios", 1, 20, st.session_state["media"])
-    st.session_state["desviacion"] = st.slider("Desviación estándar de cantidad", 1, 10, st.session_state["desviacion"])
-    st.session_state["tiempo_base_entrega"] = st.slider("Tiempo base de entrega (días)", 1, 10, st.session_state.get("tiempo_base_entrega", 3))
-
-media = st.session_state["media"]
-desviacion = st.session_state["desviacion"]
-tiempo_base_entrega = st.session_state["tiempo_base_entrega"]
-
-#
-with st.expander("🏭 Configuración avanzada: capacidad de producción"):
-    st.session_state["capacidad_produccion"] = st.slider(
-        "Capacidad de producción diaria (unidades)", 1, 50, st.session_state.get("capacidad_produccion", 10)
+# 2. Cargar el estado. El simulador lo comparten todas las sesiones y sólo se
+#    vuelve a leer de disco cuando estado.json cambia, no en cada rerun: la
+#    página no debe modificarlo (la capacidad elegida va en `capacidad`).
+def reemplazar_estado_corrupto():
+    # Bajo bloqueo y comprobando de nuevo: otra sesión puede haberlo reemplazado
+    # ya. El archivo corrupto se conserva como copia para poder revisarlo.
+    with bloquear_archivo(f"{ESTADO_FILE}.lock"):
+        try:
+            with open(ESTADO_FILE, "r", encoding="utf-8") as f:
+                json.load(f)
+            return None
+        except json.JSONDecodeError:
+            copia = f"{ESTADO_FILE}.corrupto-{datetime.now():%Y%m%d-%H%M%S}"
+            os.replace(ESTADO_FILE, copia)
+            inicializar_estado()
+            return copia
+
+try:
+    sim = obtener_lector().leer()
+except json.JSONDecodeError:
+    copia = reemplazar_estado_corrupto()
+    sim = obtener_lector().leer()
+    if copia:
+        st.warning(f"El archivo estado.json estaba corrupto: se ha guardado una copia en {copia} y se ha cargado un estado inicial.")
+if necesita_sincronizar(sim):
+    # El índice va por detrás (p. ej. el estado se guardó sin él): se
+    # reconstruye con el bloqueo del estado, nunca desde esta copia
+    obtener_lector().sincronizar_indice()
+
+worker = obtener_worker()
+
+def ejecutar_comando(tipo, espera=10, **params):
+    # Las modificaciones del estado las aplica el worker; las acciones cortas se
+    # esperan para poder recargar la página con el resultado.
+    comando = worker.enviar(tipo, **params)
+    if not comando["hecho"].wait(timeout=espera):
+        st.info("⏳ Solicitud en cola: se aplicará cuando termine la simulación en curso.")
+        return None
+    if comando["error"]:
+        st.error(f"No se pudo completar la operación: {comando['error']}")
+        return None
+    return comando["resultado"] if comando["resultado"] is not None else True
+
+# ===== Paneles =====
+def panel(titulo, clave, abierto=False):
+    # A diferencia de st.expander, el contenido de un panel cerrado no se
+    # ejecuta: el cuerpo sólo se construye si el interruptor está activo.
+    return st.toggle(titulo, value=abierto, key=f"panel_{clave}")
+
+
+POR_PAGINA = 20
+
+def filtros_tabla(clave, proveedor=False, estados=None, tipos=None):
+    # Filtros comunes a las tablas paginadas; devuelve los argumentos de la consulta
+    filtros = {}
+    cols = st.columns(4)
+
+    rango = cols[0].date_input("Rango de fechas", value=(), key=f"{clave}_fechas")
+    if len(rango) > 0:
+        filtros["desde"] = rango[0]
+    if len(rango) > 1:
+        filtros["hasta"] = rango[1]
+
+    productos_dict = {p.id: p.name for p in sim.products}
+    filtros["product_id"] = cols[1].selectbox(
+        "Producto", [None] + list(productos_dict),
+        format_func=lambda pid: "Todos" if pid is None else f"{pid} - {productos_dict[pid]}",
+        key=f"{clave}_producto"
     )
 
-sim.daily_capacity = st.session_state["capacidad_produccion"]
-
-
-# Botón para avanzar día
-if st.button("▶️ Avanzar Día"):
-    sim.advance_day(media=media, desviacion=desviacion,tiempo_base_entrega=tiempo_base_entrega)
-    guardar_estado(sim)
-    st.success("Día avanzado y estado guardado")
-    st.rerun()
+    if proveedor:
+        proveedores_dict = {s.id: s.name for s in sim.suppliers}
+        filtros["supplier_id"] = cols[2].selectbox(
+            "Proveedor", [None] + list(proveedores_dict),
+            format_func=lambda sid: "Todos" if sid is None else proveedores_dict[sid],
+            key=f"{clave}_proveedor"
+        )
+    if estados:
+        filtros["status"] = cols[3].selectbox(
+            "Estado", [None] + estados, format_func=lambda e: "Todos" if e is None else e, key=f"{clave}_estado"
+        )
+    if tipos:
+        filtros["tipo"] = cols[3].selectbox(
+            "Tipo", [None] + tipos, format_func=lambda t: "Todos" if t is None else t, key=f"{clave}_tipo"
+        )
+
+    return filtros
+
+
+def consultar_paginado(consulta, clave, **filtros):
+    # Sólo se piden al índice las filas de la página visible
+    clave_pagina = f"{clave}_pagina"
+    pagina = st.session_state.get(clave_pagina, 1)
+    filas, total = consulta(pagina=pagina, por_pagina=POR_PAGINA, **filtros)
+
+    paginas = max(1, math.ceil(total / POR_PAGINA))
+    if pagina > paginas:
+        # Los filtros han reducido el resultado: saltamos a la última página
+        pagina = paginas
+        st.session_state[clave_pagina] = paginas
+        filas, total = consulta(pagina=pagina, por_pagina=POR_PAGINA, **filtros)
+
+    return filas, total, paginas
+
+
+def selector_pagina(clave, total, paginas):
+    st.number_input(
+        f"Página (de {paginas}, {total} registros)", min_value=1, max_value=paginas, step=1,
+        key=f"{clave}_pagina"
+    )
 
 
-# ===== Panel Pedidos =====
-st.markdown("## 📦 Pedidos Pendientes")
+def mostrar_faltantes_globales():
+    import pandas as pd
 
-with st.expander("📉 Ver resumen avanzado de faltantes globales"):
-    faltantes = calcular_faltantes()
+    faltantes = sim.calcular_faltantes()
 
     if faltantes:
         materiales_faltantes = []
@@ -255,42 +214,30 @@ with st.expander("📉 Ver resumen avanzado de faltantes globales"):
         st.dataframe(df_faltantes, use_container_width=True, hide_index=True)
 
         if st.button("🛒 Comprar todo lo que falta"):
+            compras = []
             for item in materiales_faltantes:
                 proveedores = [s for s in sim.suppliers if s.product_id == item["ID"]]
                 if not proveedores:
                     continue
 
                 proveedor = min(proveedores, key=lambda p: p.lead_time)
-                cantidad = item["Cantidad"]
-
-                nuevo_po = PurchaseOrder(
-                    id=len(sim.purchase_orders) + 1,
-                    supplier_id=proveedor.id,
-                    product_id=item["ID"],
-                    quantity=cantidad,
-                    unit_cost=proveedor.unit_cost,
-                    order_date=sim.current_date,
-                    expected_arrival=sim.current_date + timedelta(days=proveedor.lead_time),
-                    status="ordered"
-                )
-                sim.purchase_orders.append(nuevo_po)
-
-                sim.log_event(
-                    event_type="purchase",
-                    description="Compra global desde faltantes",
-                    product_id=item["ID"],
-                    quantity=cantidad,
-                    extra={
+                compras.append({
+                    "supplier_id": proveedor.id,
+                    "product_id": item["ID"],
+                    "quantity": item["Cantidad"],
+                    "descripcion": "Compra global desde faltantes",
+                    "extra": {
                         "proveedor": proveedor.name,
                         "lead_time": proveedor.lead_time
                     }
-                )
+                })
 
                 resumen_proveedores.append(
                     f"- {item['Nombre']} → {proveedor.name} ({proveedor.lead_time} días)"
                 )
 
-            guardar_estado(sim)
+            if not ejecutar_comando("comprar", compras=compras, version_base=sim.version):
+                return
             st.success("✅ Órdenes de compra generadas por todos los materiales faltantes")
             st.markdown("### 🧾 Proveedores seleccionados automáticamente:")
             for linea in resumen_proveedores:
@@ -300,302 +247,572 @@ with st.expander("📉 Ver resumen avanzado de faltantes globales"):
         st.info("No hay faltantes para los pedidos actuales.")
 
 
-# Recorrer pedidos pendientes
-for order in sim.orders:
-    if order.status != "pending":
-        continue
-
-    product = next((p for p in sim.products if p.id == order.product_id), None)
-    product_name = product.name if product else "Desconocido"
-
-    # Mostrar resumen del pedido
-    col1, col2, col3, col4, col5 = st.columns([1.5, 3, 2, 3, 1.5])
-    col1.write(f"**#{order.id}**")
-    col2.write(f"{product_name}")
-    col3.write(f"{order.quantity} unidades")
-
-    entrega = order.delivery_date.strftime("%Y-%m-%d") if order.delivery_date else "N/D"
-    retrasado = order.delivery_date and sim.current_date > order.delivery_date
-    col4.markdown(f"<span style='color:red;'>📅 {entrega} (retrasado)</span>" if retrasado else f"📅 {entrega}", unsafe_allow_html=True)
-
-    if col5.button("🔍 Detalles", key=f"btn_detalle_{order.id}"):
-        st.session_state[f"mostrar_detalle_{order.id}"] = not st.session_state.get(f"mostrar_detalle_{order.id}", False)
-
-    if st.session_state.get(f"mostrar_detalle_{order.id}", False):
-        st.markdown(f"### 📄 Detalles del Pedido #{order.id} - {product_name}")
-        st.markdown(f"📆 **Entrega estimada:** {entrega}")
-
-        # === Inventario neto descontando reservas de otros pedidos liberados ===
-        inventario_neto = sim.inventory.copy()
-        for o in sim.orders:
-            if o.status == "released" and o.id != order.id:
-                for bom in sim.boms:
-                    if bom.finished_product_id == o.product_id:
-                        inventario_neto[bom.material_id] -= bom.quantity * o.quantity
-
-        # === Lista de materiales requeridos ===
-        materiales = [b for b in sim.boms if b.finished_product_id == order.product_id]
-        bom_data = []
-        for mat in materiales:
-            total = mat.quantity * order.quantity
-            en_stock = inventario_neto.get(mat.material_id, 0)
-            faltan = max(0, total - en_stock)
-            bom_data.append({
-                "Material ID": mat.material_id,
-                "Cantidad x unidad": mat.quantity,
-                "Total requerido": total,
-                "En inventario (neto)": en_stock,
-                "Faltan": faltan,
-            })
+def mostrar_detalle_pedido(order, product_name, entrega):
+    import pandas as pd
 
-        st.markdown("#### 📋 Lista de materiales requeridos")
-        df_bom = pd.DataFrame(bom_data)
-        st.dataframe(df_bom, use_container_width=True, hide_index=True)
+    st.markdown(f"### 📄 Detalles del Pedido #{order.id} - {product_name}")
+    st.markdown(f"📆 **Entrega estimada:** {entrega}")
 
-        # === Acciones para faltantes ===
-        for item in bom_data:
-            if item["Faltan"] > 0:
-                st.markdown(f"**🔧 Acción requerida: Material {item['Material ID']}**")
+    # === Inventario neto descontando reservas de otros pedidos liberados ===
+    inventario_neto = sim.inventory.copy()
+    for o in sim.orders:
+        if o.status == "released" and o.id != order.id:
+            for bom in sim.boms:
+                if bom.finished_product_id == o.product_id:
+                    inventario_neto[bom.material_id] -= bom.quantity * o.quantity
+
+    # === Lista de materiales requeridos ===
+    materiales = [b for b in sim.boms if b.finished_product_id == order.product_id]
+    bom_data = []
+    for mat in materiales:
+        total = mat.quantity * order.quantity
+        en_stock = inventario_neto.get(mat.material_id, 0)
+        faltan = max(0, total - en_stock)
+        bom_data.append({
+            "Material ID": mat.material_id,
+            "Cantidad x unidad": mat.quantity,
+            "Total requerido": total,
+            "En inventario (neto)": en_stock,
+            "Faltan": faltan,
+        })
 
-                with st.expander(f"🛒 Comprar {item['Faltan']} unidades", expanded=False):
-                    proveedores = [s for s in sim.suppliers if s.product_id == item["Material ID"]]
-                    if not proveedores:
-                        st.warning("⚠️ No hay proveedores disponibles para este material.")
-                        continue
+    st.markdown("#### 📋 Lista de materiales requeridos")
+    df_bom = pd.DataFrame(bom_data)
+    st.dataframe(df_bom, use_container_width=True, hide_index=True)
 
-                    proveedor_opciones = {
-                        f"{p.name} (lead time: {p.lead_time} días)": p for p in proveedores
-                    }
+    # === Acciones para faltantes ===
+    for item in bom_data:
+        if item["Faltan"] > 0:
+            st.markdown(f"**🔧 Acción requerida: Material {item['Material ID']}**")
+
+            with st.expander(f"🛒 Comprar {item['Faltan']} unidades", expanded=False):
+                proveedores = [s for s in sim.suppliers if s.product_id == item["Material ID"]]
+                if not proveedores:
+                    st.warning("⚠️ No hay proveedores disponibles para este material.")
+                    continue
+
+                proveedor_opciones = {
+                    f"{p.name} (lead time: {p.lead_time} días)": p for p in proveedores
+                }
 
-                    seleccion = st.selectbox(
-                        "Selecciona proveedor:",
-                        options=list(proveedor_opciones.keys()),
-                        key=f"select_proveedor_{order.id}_{item['Material ID']}"
-                    )
-
-                    proveedor = proveedor_opciones[seleccion]
-                    costo_total = item["Faltan"] * proveedor.unit_cost
-                    st.write(f"💰 Costo estimado: {item['Faltan']} x {proveedor.unit_cost:.2f} = {costo_total:.2f}")
-
-                    if st.button("Confirmar compra", key=f"confirmar_compra_{order.id}_{item['Material ID']}"):
-                        nuevo_po = PurchaseOrder(
-                            id=len(sim.purchase_orders) + 1,
-                            supplier_id=proveedor.id,
-                            product_id=item["Material ID"],
-                            quantity=item["Faltan"],
-                            unit_cost=proveedor.unit_cost,
-                            order_date=sim.current_date,
-                            expected_arrival=sim.current_date + timedelta(days=proveedor.lead_time),
-                            status="ordered"
-                        )
-                        sim.purchase_orders.append(nuevo_po)
-                        sim.log_event("purchase", f"Pedido de compra generado: {item['Faltan']} x de Material (ID:{item['Material ID']}) al proveedor {proveedor.name}")
-                        guardar_estado(sim)
+                seleccion = st.selectbox(
+                    "Selecciona proveedor:",
+                    options=list(proveedor_opciones.keys()),
+                    key=f"select_proveedor_{order.id}_{item['Material ID']}"
+                )
+
+                proveedor = proveedor_opciones[seleccion]
+                costo_total = item["Faltan"] * proveedor.unit_cost
+                st.write(f"💰 Costo estimado: {item['Faltan']} x {proveedor.unit_cost:.2f} = {costo_total:.2f}")
+
+                if st.button("Confirmar compra", key=f"confirmar_compra_{order.id}_{item['Material ID']}"):
+                    compra = {
+                        "supplier_id": proveedor.id,
+                        "product_id": item["Material ID"],
+                        "quantity": item["Faltan"],
+                        "descripcion": f"Pedido de compra generado: {item['Faltan']} x de Material (ID:{item['Material ID']}) al proveedor {proveedor.name}"
+                    }
+                    if ejecutar_comando("comprar", compras=[compra], version_base=sim.version):
                         st.success(f"✅ Pedido de compra registrado con {proveedor.name}")
                         st.rerun()
 
-        # === Evaluar liberación con inventario neto ===
-        puede_liberar = all(item["Faltan"] == 0 for item in bom_data)
-        if puede_liberar:
-            if st.button(f"✅ Liberar pedido #{order.id}", key=f"liberar_{order.id}"):
-                order.status = "released"
-                sim.log_event("stock", f"Pedido #{order.id} liberado para producción.")
-                guardar_estado(sim)
+    # === Evaluar liberación con inventario neto ===
+    puede_liberar = all(item["Faltan"] == 0 for item in bom_data)
+    if puede_liberar:
+        if st.button(f"✅ Liberar pedido #{order.id}", key=f"liberar_{order.id}"):
+            if ejecutar_comando("liberar", order_id=order.id):
                 st.rerun()
 
-        st.divider()
+    st.divider()
+
+
+def mostrar_pedidos_pendientes():
+    productos_dict = {p.id: p.name for p in sim.products}
+
+    filtros = filtros_tabla("pendientes")
+    filas, total, paginas = consultar_paginado(
+        consultar_pedidos, "pendientes", status="pending", descendente=False, **filtros
+    )
+    if not filas:
+        st.info("No hay pedidos pendientes para los filtros seleccionados.")
+
+    for fila in filas:
+        # La fila sale del índice, que el worker puede haber reescrito después
+        # de cargar esta página: el resumen se construye con la propia fila
+        product_name = productos_dict.get(fila["product_id"], "Desconocido")
+
+        # Mostrar resumen del pedido
+        col1, col2, col3, col4, col5 = st.columns([1.5, 3, 2, 3, 1.5])
+        col1.write(f"**#{fila['id']}**")
+        col2.write(f"{product_name}")
+        col3.write(f"{fila['quantity']} unidades")
+
+        entrega = fila["delivery_date"] or "N/D"
+        retrasado = fila["delivery_date"] and sim.current_date.isoformat() > fila["delivery_date"]
+        col4.markdown(f"<span style='color:red;'>📅 {entrega} (retrasado)</span>" if retrasado else f"📅 {entrega}", unsafe_allow_html=True)
+
+        if col5.button("🔍 Detalles", key=f"btn_detalle_{fila['id']}"):
+            st.session_state[f"mostrar_detalle_{fila['id']}"] = not st.session_state.get(f"mostrar_detalle_{fila['id']}", False)
+
+        if st.session_state.get(f"mostrar_detalle_{fila['id']}", False):
+            order = next((o for o in sim.orders if o.id == fila["id"]), None)
+            if order is None:
+                st.info("⏳ Este pedido aún no está en el estado cargado; se mostrará al recargar.")
+            else:
+                mostrar_detalle_pedido(order, product_name, entrega)
+
+    selector_pagina("pendientes", total, paginas)
+
+
+@st.cache_data(max_entries=4)
+def plan_liberacion(estado, capacidad, lineas, _sim):
+    # El plan depende del estado guardado y de la capacidad: la del control
+    # de la sesión o, si hay líneas, la de su configuración
+    from utils.planificador import planificar
+    return planificar(_sim, capacidad=capacidad)
+
+
+def mostrar_plan_liberacion():
+    import pandas as pd
+
+    lineas = tuple((l.id, l.daily_capacity, tuple(l.product_ids)) for l in sim.lines)
+    plan = plan_liberacion((sim.instancia, sim.version), capacidad, lineas, sim)
+    productos_dict = {p.id: p.name for p in sim.products}
+
+    cols = st.columns(4)
+    cols[0].metric("Retraso total previsto (días)", plan["retraso_total"])
+    cols[1].metric("Pedidos retrasados", plan["pedidos_retrasados"])
+    cols[2].metric("A liberar hoy", len(plan["liberar"]))
+    cols[3].metric("Compras sugeridas", len(plan["compras_sugeridas"]))
+
+    if plan["pedidos"]:
+        df_plan = pd.DataFrame([{
+            "Pedido": p["order_id"],
+            "Producto": productos_dict.get(p["product_id"], "Desconocido"),
+            "Cantidad": p["quantity"],
+            "Estado": p["status"],
+            "Entrega": p["delivery_date"],
+            "Material listo": p["material_listo"],
+            "Inicio": p["inicio"],
+            "Fin": p["fin"],
+            "Retraso (días)": p["retraso"],
+            "Liberar hoy": p["liberar"],
+        } for p in plan["pedidos"]])
+        st.dataframe(df_plan, use_container_width=True, hide_index=True)
+    if plan["sin_planificar"]:
+        st.warning(f"⚠️ Pedidos sin línea o sin proveedor para algún material: {plan['sin_planificar']}")
+
+    if plan["compras_sugeridas"]:
+        st.markdown("#### 🛒 Compras sugeridas")
+        proveedores_dict = {s.id: s.name for s in sim.suppliers}
+        df_compras = pd.DataFrame([{
+            "Material": productos_dict.get(c["product_id"], c["product_id"]),
+            "Cantidad": c["quantity"],
+            "Proveedor": proveedores_dict.get(c["supplier_id"], "N/D"),
+            "Llegada prevista": c["expected_arrival"],
+        } for c in plan["compras_sugeridas"]])
+        st.dataframe(df_compras, use_container_width=True, hide_index=True)
+
+    col_liberar, col_comprar = st.columns(2)
+    if plan["liberar"] and col_liberar.button(f"✅ Liberar {len(plan['liberar'])} pedido(s) según el plan"):
+        # El worker recalcula el plan sobre el estado más reciente antes de liberar
+        if ejecutar_comando("planificar", espera=30, liberar=True, capacidad=capacidad):
+            st.rerun()
+    if plan["compras_sugeridas"] and col_comprar.button("🛒 Emitir compras sugeridas"):
+        if ejecutar_comando(
+            "planificar", espera=30, liberar=False, comprar=True, version_base=sim.version,
+            capacidad=capacidad
+        ):
+            st.rerun()
+
+
+def mostrar_inventario():
+    import pandas as pd
+
+    productos_dict = {p.id: p for p in sim.products}
+
+    st.markdown("### Materiales")
+    materiales_data = []
+    for pid, qty in sim.inventory.items():
+        product = productos_dict.get(pid)
+        if product and product.type == "raw":
+            materiales_data.append({"ID": pid, "Nombre": product.name, "Cantidad": qty})
+
+    if materiales_data:
+        df_materiales = pd.DataFrame(materiales_data)
+        st.dataframe(df_materiales.style.hide(axis="index"),hide_index=True)
+    else:
+        st.info("No se dispone de materiales")
+
+    st.markdown("### Productos terminados")
+    productos_data = []
+    for pid, qty in sim.inventory.items():
+        product = productos_dict.get(pid)
+        if product and product.type == "finished":
+            productos_data.append({"ID": pid, "Nombre": product.name, "Cantidad": qty})
+
+    if productos_data:
+        df_productos = pd.DataFrame(productos_data)
+        st.dataframe(df_productos.style.hide(axis="index"), hide_index=True)
+    else:
+        st.info("No se dispone de productos")
+
+
+def mostrar_ordenes_compra():
+    import pandas as pd
+
+    if sim.purchase_orders:
+        filtros = filtros_tabla("compras", proveedor=True, estados=["ordered", "received"])
+        filas, total, paginas = consultar_paginado(consultar_ordenes_compra, "compras", **filtros)
+
+        proveedores_dict = {s.id: s.name for s in sim.suppliers}
+        productos_dict = {p.id: p.name for p in sim.products}
+        tabla_oc = []
+        for po in filas:
+            proveedor = proveedores_dict.get(po["supplier_id"], "Desconocido")
+            producto = productos_dict.get(po["product_id"], f"ID {po['product_id']}")
+            tabla_oc.append({
+                "OC #": po["id"],
+                "Producto": producto,
+                "Proveedor": proveedor,
+                "Cantidad": po["quantity"],
+                "Fecha de orden": po["order_date"],
+                "Fecha estimada llegada": po["expected_arrival"],
+                "Estado": po["status"]
+            })
+
+        df_oc = pd.DataFrame(tabla_oc)
+        st.dataframe(df_oc, use_container_width=True, hide_index=True)
+        selector_pagina("compras", total, paginas)
+    else:
+        st.info("No hay órdenes de compra registradas.")
+
+
+def mostrar_pedidos_completados():
+    import pandas as pd
+
+    filtros = filtros_tabla("completados")
+    filas, total, paginas = consultar_paginado(consultar_pedidos, "completados", status="completed", **filtros)
+
+    if filas:
+        productos_dict = {p.id: p.name for p in sim.products}
+        tabla = []
+        for order in filas:
+            product_name = productos_dict.get(order["product_id"], f"ID {order['product_id']}")
+            cantidad_total = order["initial_quantity"] or order["quantity"]
+
+            fila = {
+                "Pedido #": order["id"],
+                "Producto": product_name,
+                "Cantidad producida": cantidad_total,
+                "Fecha de entrega estimada": order["delivery_date"] or "N/D",
+                "Estado": "✅ Completado"
+            }
+            tabla.append(fila)
+
+        df = pd.DataFrame(tabla)
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No hay pedidos completados para los filtros seleccionados.")
+    selector_pagina("completados", total, paginas)
+
+
+def mostrar_eventos():
+    import pandas as pd
+
+    filtros = filtros_tabla("eventos", proveedor=True, tipos=["purchase", "stock", "order", "production"])
+    filas, total, paginas = consultar_paginado(consultar_eventos, "eventos", **filtros)
+
+    if filas:
+        tabla = [{
+            "Evento #": e["id"],
+            "Fecha": e["sim_date"],
+            "Tipo": e["type"],
+            "Descripción": e["description"],
+            "Producto": e["product_id"],
+            "Pedido": e["order_id"],
+            "Cantidad": e["quantity"],
+        } for e in filas]
+
+        df = pd.DataFrame(tabla)
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No hay eventos para los filtros seleccionados.")
+    selector_pagina("eventos", total, paginas)
+
+
+def mostrar_pedidos_en_produccion():
+    import pandas as pd
+
+    filtros = filtros_tabla("liberados")
+    filas, total, paginas = consultar_paginado(
+        consultar_pedidos, "liberados", status="released", descendente=False, **filtros
+    )
+
+    if filas:
+        productos_dict = {p.id: p.name for p in sim.products}
+        tabla = []
+        for order in filas:
+            product_name = productos_dict.get(order["product_id"], f"ID {order['product_id']}")
+            cantidad_total = order["initial_quantity"] or order["quantity"]
+            cantidad_restante = order["quantity"]
+            cantidad_producida = cantidad_total - cantidad_restante
+            estado = "🔄 Parcial" if cantidad_producida > 0 else "⏳ Esperando"
+
+            progreso = cantidad_producida / cantidad_total if cantidad_total > 0 else 0
+            barra = f"[{'█' * int(progreso * 10):<10}] {int(progreso * 100)}%"
+
+            fila = {
+                "Pedido #": order["id"],
+                "Producto": product_name,
+                "Producido": cantidad_producida,
+                "Restante": cantidad_restante,
+                "Progreso": barra,
+                "Estado": estado
+            }
+            tabla.append(fila)
+
+        df = pd.DataFrame(tabla)
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No hay pedidos liberados en cola de producción.")
+    selector_pagina("liberados", total, paginas)
+
+
+# Las cachés se indexan por (instancia, versión) del estado: la versión sola se
+# repite si el estado se reinicia desde cero.
+@st.cache_data(max_entries=8)
+def series_inventario(estado, _inventory_history):
+    # Sólo se recalcula tras un guardado
+    return series_por_producto(_inventory_history)
+
+
+@st.cache_data(max_entries=8)
+def productos_historial(estado, _inventory_history):
+    # Lista aparte: cada rerun la necesita y es mucho más pequeña que las series
+    return list(dict.fromkeys(pid for entrada in _inventory_history for pid in entrada["inventory"]))
+
+
+@st.cache_data(max_entries=32)
+def grafico_inventario(estado, pids, _inventory_history, _nombres):
+    series = series_inventario(estado, _inventory_history)
+    reducidas = {pid: reducir_serie(*series[pid]) for pid in pids}
+    return dibujar_inventario(reducidas, _nombres)
+
+
+def mostrar_inventario_historico():
+    if sim.inventory_history:
+        estado = (sim.instancia, sim.version)
+
+        # Selección de productos para graficar (se pueden superponer varios)
+        pids_disponibles = productos_historial(estado, sim.inventory_history)
+        productos_dict = {p.id: p.name for p in sim.products}
+        seleccion = st.multiselect(
+            "Selecciona materiales:", pids_disponibles, default=pids_disponibles[:1],
+            format_func=lambda pid: f"{pid} - {productos_dict.get(pid, 'Desconocido')}"
+        )
+
+        if seleccion:
+            st.image(grafico_inventario(estado, tuple(seleccion), sim.inventory_history, productos_dict))
+        else:
+            st.info("Selecciona al menos un material.")
+    else:
+        st.info("Aún no hay historial de inventario para graficar.")
+
+
+# ===== Encabezado =====
+st.title("Simulador MRP - Producción Impresoras 3D")
+st.subheader(f"Día simulado: {sim.day} ({sim.current_date})")
+
+# Inicializar valores por defecto si no existen
+if "media" not in st.session_state:
+    st.session_state["media"] = 5
+if "desviacion" not in st.session_state:
+    st.session_state["desviacion"] = 2
+
+# Configuración avanzada
+with st.expander("⚙️ Configuración avanzada de generación de pedidos"):
+    st.session_state["media"] = st.slider("Media de pedidos diarios", 1, 20, st.session_state["media"])
+    st.session_state["desviacion"] = st.slider("Desviación estándar de cantidad", 1, 10, st.session_state["desviacion"])
+    st.session_state["tiempo_base_entrega"] = st.slider("Tiempo base de entrega (días)", 1, 10, st.session_state.get("tiempo_base_entrega", 3))
+
+media = st.session_state["media"]
+desviacion = st.session_state["desviacion"]
+tiempo_base_entrega = st.session_state["tiempo_base_entrega"]
+
+#
+with st.expander("🏭 Configuración avanzada: capacidad de producción"):
+    st.session_state["capacidad_produccion"] = st.slider(
+        "Capacidad de producción diaria (unidades)", 1, 50, st.session_state.get("capacidad_produccion", 10)
+    )
+
+capacidad = st.session_state["capacidad_produccion"]
+
+
+# Avance de días en segundo plano: la página sigue respondiendo mientras el worker simula
+col_dias, col_boton = st.columns([1, 3], vertical_alignment="bottom")
+dias_a_avanzar = col_dias.number_input("Días a avanzar", min_value=1, max_value=365, value=1, step=1)
+if col_boton.button("▶️ Avanzar Día"):
+    worker.enviar(
+        "avanzar", dias=int(dias_a_avanzar), media=media, desviacion=desviacion,
+        tiempo_base_entrega=tiempo_base_entrega, capacidad=capacidad, dia_base=sim.day
+    )
+    st.rerun()
+
+
+def mostrar_progreso_worker(sondeando):
+    progreso = worker.progreso()
+    # El worker ha publicado un estado distinto del mostrado, o ha terminado
+    # su trabajo: recargamos la página (y se deja de sondear). Cada versión
+    # publicada provoca como mucho una recarga: si estado.json se reinicia, la
+    # última versión del worker puede no volver a coincidir nunca.
+    publicada = progreso["version"]
+    if publicada is not None and publicada != sim.version and publicada != st.session_state.get("version_publicada"):
+        st.session_state["version_publicada"] = publicada
+        st.rerun(scope="app")
+    if sondeando and not (progreso["ocupado"] or progreso["pendientes"]):
+        st.rerun(scope="app")
+
+    if progreso["ocupado"] and progreso["comando"] in ("avanzar", "escenario"):
+        completados, totales = progreso["dias_completados"], max(1, progreso["dias_totales"])
+        texto = "Simulando día" if progreso["comando"] == "avanzar" else "Simulando escenario: día"
+        st.progress(completados / totales, text=f"⏳ {texto} {completados}/{totales}...")
+    elif progreso["pendientes"]:
+        st.info(f"⏳ {progreso['pendientes']} operación(es) en cola")
+    if progreso["error"]:
+        st.error(f"Error en la simulación: {progreso['error']}")
+
+
+# Mientras el worker tiene trabajo, sólo este fragmento se refresca cada segundo
+progreso = worker.progreso()
+ocupado = progreso["ocupado"] or progreso["pendientes"] > 0
+st.fragment(run_every=1 if ocupado else None)(mostrar_progreso_worker)(ocupado)
+
+
+# ===== Panel Pedidos =====
+st.markdown("## 📦 Pedidos Pendientes")
 
+if panel("📉 Ver resumen avanzado de faltantes globales", "faltantes"):
+    mostrar_faltantes_globales()
+
+if panel("📋 Mostrar pedidos pendientes", "pendientes", abierto=True):
+    mostrar_pedidos_pendientes()
+
+if panel("🧠 Plan de liberación (minimiza retrasos)", "plan"):
+    mostrar_plan_liberacion()
 
 
 # ===== Panel Inventario =====
 st.markdown("## Inventario")
+if panel("📦 Mostrar inventario", "inventario", abierto=True):
+    mostrar_inventario()
 
 
-st.markdown("### Materiales")
-materiales_data = []
-for pid, qty in sim.inventory.items():
-    product = next((p for p in sim.products if p.id == pid and p.type == "raw"), None)
-    if product:
-        materiales_data.append({"ID": pid, "Nombre": product.name, "Cantidad": qty})
-
-if materiales_data:
-    df_materiales = pd.DataFrame(materiales_data)
-    st.dataframe(df_materiales.style.hide(axis="index"),hide_index=True)
-else:
-    st.info("No se dispone de materiales")
-
-st.markdown("### Productos terminados")
-productos_data = []
-for pid, qty in sim.inventory.items():
-    product = next((p for p in sim.products if p.id == pid and p.type == "finished"), None)
-    if product:
-        productos_data.append({"ID": pid, "Nombre": product.name, "Cantidad": qty})
-
-if productos_data:
-    df_productos = pd.DataFrame(productos_data)
-    st.dataframe(df_productos.style.hide(axis="index"), hide_index=True) 
-else:
-    st.info("No se dispone de productos")
-
-
-# st.markdown("### Debug: Órdenes y estado")
-# for order in sim.orders:
-#     st.text(f"[DEBUG] Pedido {order.id} - Estado: {order.status} - Cantidad: {order.quantity}")
-
-# st.markdown("### Debug: Inventario actual")
-# for pid, qty in sim.inventory.items():
-#     st.text(f"[DEBUG] Producto {pid} -> Stock: {qty}")
-
-
-# ===== Panel Compras =====
-# st.markdown("## Emitir Orden de Compra")
-# producto_ids = list(set(s.product_id for s in sim.suppliers))
-# producto_seleccionado = st.selectbox("Producto", producto_ids)
-# proveedores_disponibles = [s for s in sim.suppliers if s.product_id == producto_seleccionado]
-# nombres_proveedores = [f"{s.id} - {s.name} (Lead Time: {s.lead_time} días)" for s in proveedores_disponibles]
-# proveedor_elegido_idx = st.selectbox("Proveedor", list(range(len(nombres_proveedores))), format_func=lambda i: nombres_proveedores[i])
-# cantidad = st.number_input("Cantidad a comprar", min_value=1, step=1)
-
-# if st.button("Emitir Orden"):
-#     proveedor = proveedores_disponibles[proveedor_elegido_idx]
-#     fecha_entrega = sim.current_date + timedelta(days=proveedor.lead_time)
-#     nueva_oc = PurchaseOrder(
-#         id=len(sim.purchase_orders) + 1,
-#         supplier_id=proveedor.id,
-#         product_id=proveedor.product_id,
-#         quantity=cantidad,
-#         order_date=sim.current_date,
-#         expected_arrival=fecha_entrega,
-#         status="ordered"
-#     )
-#     sim.purchase_orders.append(nueva_oc)
-#     sim.log_event("purchase", f"Orden de compra creada: {cantidad} unidades del producto {proveedor.product_id} al proveedor {proveedor.name}.")
-#     guardar_estado(sim)
-#     st.success("Orden de compra emitida")
 #===== Órdenes de Compra Emitidas =====
 st.markdown("## 📑 Órdenes de Compra Emitidas")
-
-if sim.purchase_orders:
-    tabla_oc = []
-    for po in sim.purchase_orders:
-        proveedor = next((s.name for s in sim.suppliers if s.id == po.supplier_id), "Desconocido")
-        producto = next((p.name for p in sim.products if p.id == po.product_id), f"ID {po.product_id}")
-        tabla_oc.append({
-            "OC #": po.id,
-            "Producto": producto,
-            "Proveedor": proveedor,
-            "Cantidad": po.quantity,
-            "Fecha de orden": po.order_date.strftime("%Y-%m-%d"),
-            "Fecha estimada llegada": po.expected_arrival.strftime("%Y-%m-%d"),
-            "Estado": po.status
-        })
-
-    df_oc = pd.DataFrame(tabla_oc)
-    st.dataframe(df_oc, use_container_width=True, hide_index=True)
-else:
-    st.info("No hay órdenes de compra registradas.")
+if panel("📑 Mostrar órdenes de compra", "compras"):
+    mostrar_ordenes_compra()
 
 
 # ===== Panel Producción =====
 st.markdown("## Producción")
-st.write(f"Capacidad diaria: {sim.daily_capacity} unidades")
+if sim.lines:
+    for line in sim.lines:
+        productos = ", ".join(p.name for p in sim.products if p.id in line.product_ids)
+        st.write(f"**{line.name}**: {line.daily_capacity} unidades/día ({productos})")
+else:
+    st.write(f"Capacidad diaria: {capacidad} unidades")
 
 
 st.markdown("## ✅ Pedidos Completados")
+if panel("✅ Mostrar pedidos completados", "completados"):
+    mostrar_pedidos_completados()
 
-pedidos_completados = [o for o in sim.orders if o.status == "completed"]
-
-if pedidos_completados:
-    tabla = []
-    for order in pedidos_completados:
-        product_name = next((p.name for p in sim.products if p.id == order.product_id), f"ID {order.product_id}")
-        cantidad_total = order.initial_quantity or order.quantity
-
-        fila = {
-            "Pedido #": order.id,
-            "Producto": product_name,
-            "Cantidad producida": cantidad_total,
-            "Fecha de entrega estimada": order.delivery_date.strftime("%Y-%m-%d") if order.delivery_date else "N/D",
-            "Estado": "✅ Completado"
-        }
-        tabla.append(fila)
-
-    df = pd.DataFrame(tabla)
-    st.dataframe(df, use_container_width=True, hide_index=True)
-else:
-    st.info("No hay pedidos completados aún.")
+st.markdown("## 🗒️ Registro de eventos")
+if panel("🗒️ Mostrar eventos", "eventos"):
+    mostrar_eventos()
 
 st.markdown("## 🏭 Pedidos en Producción (Liberados)")
+if panel("🏭 Mostrar pedidos liberados", "liberados", abierto=True):
+    mostrar_pedidos_en_produccion()
 
-pedidos_en_produccion = [o for o in sim.orders if o.status == "released"]
-
-if pedidos_en_produccion:
-    tabla = []
-    for order in pedidos_en_produccion:
-        product_name = next((p.name for p in sim.products if p.id == order.product_id), f"ID {order.product_id}")
-        cantidad_total = order.initial_quantity or order.quantity
-        cantidad_restante = order.quantity
-        cantidad_producida = cantidad_total - cantidad_restante
-        estado = "🔄 Parcial" if cantidad_producida > 0 else "⏳ Esperando"
-        cantidad_total = order.initial_quantity or order.quantity
-  
-        progreso = cantidad_producida / cantidad_total if cantidad_total > 0 else 0
-        barra = f"[{'█' * int(progreso * 10):<10}] {int(progreso * 100)}%"
-
-        fila = {
-            "Pedido #": order.id,
-            "Producto": product_name,
-            "Producido": cantidad_producida,
-            "Restante": cantidad_restante,
-            "Progreso": barra,
-            "Estado": estado
-        }
-        tabla.append(fila)
-
-    df = pd.DataFrame(tabla)
-    st.dataframe(df, use_container_width=True, hide_index=True)
-else:
-    st.info("No hay pedidos liberados en cola de producción.")
 
+# ===== Importación masiva =====
+def mostrar_importacion():
+    import tempfile
 
+    tipo = st.radio(
+        "Tipo de datos", ["pedidos", "compras"], horizontal=True,
+        format_func=lambda t: "Pedidos de cliente" if t == "pedidos" else "Órdenes de compra / confirmaciones"
+    )
+    if tipo == "pedidos":
+        st.caption("Columnas: product_id, quantity, y opcionalmente creation_date, delivery_date, status.")
+    else:
+        st.caption("Columnas: supplier_id, quantity, y opcionalmente product_id, order_date, expected_arrival, "
+                   "status. Una fila con id confirma una orden existente: actualiza su cantidad y fecha de llegada.")
+
+    archivo = st.file_uploader("Archivo CSV o JSONL", type=["csv", "jsonl"])
+    if archivo is not None and st.button("📥 Importar"):
+        extension = os.path.splitext(archivo.name)[1]
+        with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as f:
+            f.write(archivo.getbuffer())
+        resumen = ejecutar_comando("importar", espera=120, tipo=tipo, ruta=f.name, temporal=True)
+        if resumen:
+            st.success(f"✅ Importación completada: {resumen}")
+
+
+st.markdown("## 📥 Importación masiva")
+if panel("📥 Importar pedidos u órdenes de compra", "importacion"):
+    mostrar_importacion()
+
+
+# ===== Escenarios =====
+def mostrar_escenarios():
+    cols = st.columns(3)
+    dias = cols[0].number_input("Días a simular", min_value=1, max_value=3650, value=30, step=1, key="escenario_dias")
+    semilla = cols[1].number_input("Semilla", min_value=0, value=0, step=1, key="escenario_semilla")
+    checkpoint = cols[2].number_input(
+        "Checkpoint cada (días, 0 = sólo el final)", min_value=0, value=0, step=1, key="escenario_checkpoint"
+    )
+    st.caption(
+        f"Se usan los parámetros actuales: media {media}, desviación {desviacion}, "
+        f"tiempo base de entrega {tiempo_base_entrega}, capacidad {capacidad}. "
+        "El estado guardado no se modifica."
+    )
 
+    # Como el avance de días, el escenario lo simula el worker: la página sigue
+    # respondiendo y el progreso se muestra arriba
+    if st.button("🧪 Simular escenario"):
+        st.session_state["escenario"] = worker.enviar(
+            "escenario", dias=int(dias), media=media, desviacion=desviacion,
+            tiempo_base_entrega=tiempo_base_entrega, capacidad=capacidad, semilla=int(semilla),
+            checkpoint_cada=int(checkpoint) or None
+        )
+        st.rerun()
+
+    comando = st.session_state.get("escenario")
+    if comando is None:
+        return
+    if not comando["hecho"].is_set():
+        st.info("⏳ Simulando escenario en segundo plano...")
+    elif comando["error"]:
+        st.error(f"No se pudo simular el escenario: {comando['error']}")
+    else:
+        resultado = comando["resultado"]
+        if resultado["desde_cache"]:
+            st.success("⚡ Resultado recuperado de la caché de escenarios")
+        elif resultado["dia_reanudado"]:
+            st.info(f"Reanudado desde el checkpoint del día {resultado['dia_reanudado']}")
+        st.json(resultado["kpis"])
 
-# ===== Gráficas =====
 
-st.markdown("## 📊 Visualización de Datos")
-with st.expander("📦 Inventario histórico de materiales (gráfico de línea)"):
-    if sim.inventory_history:
-        df_inv = pd.DataFrame(sim.inventory_history)  # cada entrada: {'date': date, 'inventory': {product_id: qty}}
+st.markdown("## 🧪 Escenarios")
+if panel("🧪 Simular escenarios (qué pasaría si)", "escenarios"):
+    mostrar_escenarios()
 
-        # Convertimos a estructura tipo DataFrame con fechas como índice
-        data_por_material = {}
-        for entrada in sim.inventory_history:
-            fecha = entrada["date"]
-            for pid, cantidad in entrada["inventory"].items():
-                data_por_material.setdefault(pid, []).append((fecha, cantidad))
 
-        # Selección de producto para graficar
-        pids_disponibles = list(data_por_material.keys())
-        productos_dict = {p.id: p.name for p in sim.products}
-        nombre_productos = [f"{pid} - {productos_dict.get(pid, 'Desconocido')}" for pid in pids_disponibles]
-        seleccion = st.selectbox("Selecciona material:", nombre_productos)
-        pid_seleccionado = int(seleccion.split(" - ")[0])
-
-        datos = data_por_material[pid_seleccionado]
-        fechas, cantidades = zip(*datos)
-
-        fig, ax = plt.subplots()
-        ax.plot(fechas, cantidades, marker='o')
-        ax.set_title(f"Inventario de {productos_dict.get(pid_seleccionado, 'Desconocido')}")
-        ax.set_xlabel("Fecha")
-        ax.set_ylabel("Unidades")
-         # Formatear eje X para mostrar solo día y mes
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m'))
-        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-        ax.yaxis.set_major_locator(ticker.MaxNLocator(integer=True))
-        fig.autofmt_xdate()  # rota ligeramente las etiquetas
-
-        ax.grid(True)
-        st.pyplot(fig)
-    else:
-        st.info("Aún no hay historial de inventario para graficar.")
\ No newline at end of file
+# ===== Gráficas =====
+
+st.markdown("## 📊 Visualización de Datos")
+if panel("📦 Inventario histórico de materiales (gráfico de línea)", "historico"):
+    mostrar_inventario_historico()
@@ -23,6 +23,27 @@ class BOMItem(BaseModel):
     material_id: int
     quantity: int
 
+class ProductionLine(BaseModel):
+    id: int
+    name: str
+    daily_capacity: int
+    product_ids: List[int]  # productos terminados que puede fabricar la línea
+
+class Plant(BaseModel):
+    id: int
+    name: str
+    config_path: str = "data/configuracion.json"  # catálogo, BOMs, proveedores y líneas
+    state_path: str                                # estado.json propio de la planta
+    daily_capacity: int = 10                       # sólo si la planta no define líneas
+
+class Transfer(BaseModel):
+    origin_plant_id: int
+    destination_plant_id: int
+    product_id: int
+    quantity: int
+    lead_time: int = 1           # días de tránsito entre plantas
+    day: Optional[int] = None    # día de la red en que sale; None = en el próximo cierre
+
 class Order(BaseModel):
     id: int
     creation_date: date
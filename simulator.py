@@ -6,7 +6,7 @@ from models import Product, InventoryItem, Supplier, BOMItem, Order, PurchaseOrd
 import random
 
 class Simulator:
-    def __init__(self, env, daily_capacity=10):
+    def __init__(self, env, daily_capacity=10, seed=None):
         self.env = env
         self.day = 1
         self.daily_capacity = daily_capacity
@@ -20,6 +20,10 @@ class Simulator:
         self.current_date = date.today()
         self.inventory_history = []
         self.production_log = []
+        self.lines = []  # líneas de producción; vacío = un único pool de daily_capacity
+        self.version = 0  # se incrementa en cada guardado del estado
+        self.instancia = None  # identifica el estado: cambia si se reinicia desde cero
+        self.rng = random.Random(seed)  # generador propio: con semilla, la simulación es reproducible
 
     def log_event(
     self,
@@ -45,6 +49,36 @@ class Simulator:
         self.events.append(event)
 
 
+    def crear_orden_compra(self, proveedor, product_id, cantidad, descripcion, extra=None):
+        nuevo_po = PurchaseOrder(
+            id=len(self.purchase_orders) + 1,
+            supplier_id=proveedor.id,
+            product_id=product_id,
+            quantity=cantidad,
+            unit_cost=proveedor.unit_cost,
+            order_date=self.current_date,
+            expected_arrival=self.current_date + timedelta(days=proveedor.lead_time),
+            status="ordered"
+        )
+        self.purchase_orders.append(nuevo_po)
+        self.log_event(
+            event_type="purchase",
+            description=descripcion,
+            product_id=product_id,
+            supplier_id=proveedor.id,
+            quantity=cantidad,
+            extra=extra
+        )
+        return nuevo_po
+
+    def liberar_pedido(self, order_id):
+        order = next((o for o in self.orders if o.id == order_id), None)
+        if order is None or order.status != "pending":
+            return False
+        order.status = "released"
+        self.log_event("stock", f"Pedido #{order.id} liberado para producción.", order_id=order.id)
+        return True
+
     def advance_day(self, media=5, desviacion=2,tiempo_base_entrega=3):
         self.day += 1
         self.current_date += timedelta(days=1)
@@ -83,16 +117,34 @@ class Simulator:
                     }
                 )
 
+    def capacidades_del_dia(self):
+        # Sin líneas configuradas la planta es un único pool de capacidad
+        # (daily_capacity) compartido por todos los productos
+        if not self.lines:
+            return [{"line": None, "capacity": self.daily_capacity, "products": None}]
+        return [
+            {"line": line, "capacity": line.daily_capacity, "products": set(line.product_ids)}
+            for line in self.lines
+        ]
+
     def process_production(self):
-        capacity = self.daily_capacity
+        lineas = self.capacidades_del_dia()
         produccion_por_producto = defaultdict(int)
 
         for order in self.orders:
-            if order.status == "released" and capacity > 0:
-                required = self.get_bom_for_product(order.product_id)
+            if order.status != "released":
+                continue
+            required = self.get_bom_for_product(order.product_id)
+
+            # Enrutado: el pedido se reparte entre las líneas que fabrican su producto
+            for linea in lineas:
+                if linea["capacity"] <= 0:
+                    continue
+                if linea["products"] is not None and order.product_id not in linea["products"]:
+                    continue
 
                 # Determinar el máximo que se puede producir hoy
-                max_producible = min(capacity, self.max_units_producible(required))
+                max_producible = min(linea["capacity"], self.max_units_producible(required))
                 if max_producible == 0:
                     continue
 
@@ -102,9 +154,16 @@ class Simulator:
                 self.consume_materials(required, cantidad_producida)
                 self.inventory[order.product_id] = self.inventory.get(order.product_id, 0) + cantidad_producida
                 order.quantity -= cantidad_producida
-                capacity -= cantidad_producida
+                linea["capacity"] -= cantidad_producida
                 produccion_por_producto[order.product_id] += cantidad_producida
 
+                extra = {
+                    "pedido_restante": order.quantity,
+                    "capacidad_restante": linea["capacity"]
+                }
+                if linea["line"] is not None:
+                    extra["linea"] = linea["line"].name
+
                 # Log de producción parcial
                 self.log_event(
                     event_type="production",
@@ -112,10 +171,7 @@ class Simulator:
                     product_id=order.product_id,
                     order_id=order.id,
                     quantity=cantidad_producida,
-                    extra={
-                        "pedido_restante": order.quantity,
-                        "capacidad_restante": capacity
-                    }
+                    extra=extra
                 )
 
                 # Si el pedido se completa
@@ -129,12 +185,78 @@ class Simulator:
                         quantity=0,
                         extra={"estado": "completado"}
                     )
+                    break
 
         self.production_log.append({
             "date": self.current_date,
             "produced": dict(produccion_por_producto)
         })
         
+    # ===== Lógica MRP =====
+    def calcular_faltantes(self):
+        requerimientos = defaultdict(int)
+
+        # Paso 1: sumar materiales requeridos por pedidos pendientes
+        for order in self.orders:
+            if order.status == "pending":
+                for bom in self.boms:
+                    if bom.finished_product_id == order.product_id:
+                        requerimientos[bom.material_id] += bom.quantity * order.quantity
+
+        # Paso 2: restar materiales que ya están comprometidos en pedidos liberados
+        reservas = defaultdict(int)
+        for order in self.orders:
+            if order.status == "released":
+                for bom in self.boms:
+                    if bom.finished_product_id == order.product_id:
+                        reservas[bom.material_id] += bom.quantity * order.quantity
+
+        # Paso 3: calcular faltantes reales
+        faltantes = {}
+        for pid, req_qty in requerimientos.items():
+            en_stock = self.inventory.get(pid, 0)
+            reservado = reservas.get(pid, 0)
+            disponible = en_stock - reservado
+
+            if req_qty > disponible:
+                faltantes[pid] = req_qty - disponible
+
+        return faltantes
+
+    def calcular_faltantes_by_order(self, order):
+        # Copiamos el inventario actual
+        inventario_disponible = self.inventory.copy()
+
+        # Reservamos materiales para pedidos ya liberados (que aún no se han completado)
+        for o in self.orders:
+            if o.status == "released" and o.id != order.id:
+                for bom in self.boms:
+                    if bom.finished_product_id == o.product_id:
+                        inventario_disponible[bom.material_id] = inventario_disponible.get(bom.material_id, 0) - bom.quantity * o.quantity
+
+        # Requerimientos del pedido actual
+        requerimientos = defaultdict(int)
+        for bom in self.boms:
+            if bom.finished_product_id == order.product_id:
+                requerimientos[bom.material_id] += bom.quantity * order.quantity
+
+        # Calcular faltantes reales
+        faltantes = {}
+        for pid, req_qty in requerimientos.items():
+            en_stock = inventario_disponible.get(pid, 0)
+            if req_qty > en_stock:
+                faltantes[pid] = req_qty - en_stock
+
+        return faltantes
+
+    def en_camino(self):
+        # Unidades compradas que aún no han llegado, por producto
+        pendientes = defaultdict(int)
+        for po in self.purchase_orders:
+            if po.status == "ordered":
+                pendientes[po.product_id] += po.quantity
+        return dict(pendientes)
+
     def max_units_producible(self, bom_items):
         unidades_posibles = []
         for item in bom_items:
@@ -164,8 +286,8 @@ class Simulator:
         if not productos_finales:
             return  # Nada que generar
 
-        cantidad = max(1, int(random.gauss(media, desviacion)))
-        producto = random.choice(productos_finales)
+        cantidad = max(1, int(self.rng.gauss(media, desviacion)))
+        producto = self.rng.choice(productos_finales)
 
         dias_base = tiempo_base_entrega  # tiempo mínimo
         dias_extra = cantidad // 5  # +1 día por cada 5 unidades
@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+
+# Índice en SQLite de pedidos, órdenes de compra y eventos. estado.json sigue
+# siendo la fuente de verdad; esta base se actualiza en cada guardado (sólo
+# con lo que ha cambiado) para que las tablas del dashboard pidan sólo la
+# página visible. La tabla meta guarda la instancia y la versión del estado
+# indexado, para no sobrescribir nunca un índice con un estado más antiguo.
+DB_FILE = "./data/estado.db"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    creation_date TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    delivery_date TEXT,
+    initial_quantity INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_orders_status_delivery ON orders(status, delivery_date);
+CREATE INDEX IF NOT EXISTS idx_orders_product ON orders(product_id);
+
+CREATE TABLE IF NOT EXISTS purchase_orders (
+    id INTEGER PRIMARY KEY,
+    supplier_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    order_date TEXT NOT NULL,
+    expected_arrival TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_po_status_arrival ON purchase_orders(status, expected_arrival);
+CREATE INDEX IF NOT EXISTS idx_po_order_date ON purchase_orders(order_date);
+CREATE INDEX IF NOT EXISTS idx_po_product ON purchase_orders(product_id);
+CREATE INDEX IF NOT EXISTS idx_po_supplier ON purchase_orders(supplier_id);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    sim_date TEXT NOT NULL,
+    type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    product_id INTEGER,
+    order_id INTEGER,
+    supplier_id INTEGER,
+    quantity INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_date ON events(sim_date);
+CREATE INDEX IF NOT EXISTS idx_events_type_date ON events(type, sim_date);
+CREATE INDEX IF NOT EXISTS idx_events_product ON events(product_id);
+"""
+
+# Columna de fecha por la que se filtra cada tabla
+_CAMPO_FECHA = {
+    "orders": "delivery_date",
+    "purchase_orders": "order_date",
+    "events": "sim_date",
+}
+
+
+def _conectar(ruta):
+    conn = sqlite3.connect(ruta)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _version_indexada(conn):
+    meta = dict(conn.execute("SELECT clave, valor FROM meta").fetchall())
+    version = meta.get("version")
+    return meta.get("instancia"), int(version) if version is not None else None
+
+
+def _fila_pedido(o):
+    return (o.id, o.creation_date.isoformat(), o.product_id, o.quantity, o.status,
+            o.delivery_date.isoformat() if o.delivery_date else None, o.initial_quantity)
+
+
+def _fila_orden_compra(po):
+    return (po.id, po.supplier_id, po.product_id, po.quantity,
+            po.order_date.isoformat(), po.expected_arrival.isoformat(), po.status)
+
+
+def _fila_evento(e):
+    return (e.id, e.sim_date.isoformat(), e.type, e.description, e.product_id, e.order_id,
+            e.supplier_id, e.quantity, json.dumps(e.extra, ensure_ascii=False) if e.extra else None)
+
+
+# Estados en los que una fila aún puede cambiar; las demás son definitivas
+_ABIERTOS = {
+    "orders": ("pending", "released", "in_production"),
+    "purchase_orders": ("ordered",),
+}
+
+
+def _actualizar_tabla(conn, tabla, objetos, fila):
+    # Sólo se escriben las filas nuevas (id mayor que el último indexado) y
+    # las abiertas que han cambiado: un pedido completado o una orden
+    # recibida ya no se modifican.
+    ultimo = conn.execute(f"SELECT MAX(id) FROM {tabla}").fetchone()[0] or 0
+    estados = _ABIERTOS[tabla]
+    abiertas = {
+        r[0]: tuple(r) for r in conn.execute(
+            f"SELECT * FROM {tabla} WHERE status IN ({', '.join('?' * len(estados))})", estados
+        )
+    }
+    cambios = []
+    for obj in objetos:
+        if obj.id > ultimo:
+            cambios.append(fila(obj))
+        elif obj.id in abiertas:
+            nueva = fila(obj)
+            if nueva != abiertas[obj.id]:
+                cambios.append(nueva)
+    if cambios:
+        columnas = ", ".join("?" * len(cambios[0]))
+        conn.executemany(f"INSERT OR REPLACE INTO {tabla} VALUES ({columnas})", cambios)
+
+
+def _eventos_nuevos(conn, eventos):
+    # Los eventos sólo se añaden al final, con id creciente
+    ultimo = conn.execute("SELECT MAX(id) FROM events").fetchone()[0] or 0
+    nuevos = []
+    for e in reversed(eventos):
+        if e.id <= ultimo:
+            break
+        nuevos.append(_fila_evento(e))
+    return reversed(nuevos)
+
+
+def sincronizar(sim, ruta=DB_FILE):
+    """Actualiza el índice con el estado del simulador en una única transacción.
+
+    Si el índice es de este mismo estado sólo se escribe lo que ha cambiado;
+    si es de otro (o no existe) se reconstruye entero. Si ya tiene esta
+    versión del estado o una posterior, no se toca. Devuelve True si se ha
+    escrito.
+    """
+    with closing(_conectar(ruta)) as conn:
+        conn.executescript(_ESQUEMA)
+        # BEGIN IMMEDIATE toma el bloqueo de escritura antes de leer la versión
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            instancia, version = _version_indexada(conn)
+            if instancia == sim.instancia and version is not None and version >= sim.version:
+                conn.rollback()
+                return False
+
+            if instancia != sim.instancia or version is None:
+                conn.execute("DELETE FROM orders")
+                conn.execute("DELETE FROM purchase_orders")
+                conn.execute("DELETE FROM events")
+            _actualizar_tabla(conn, "orders", sim.orders, _fila_pedido)
+            _actualizar_tabla(conn, "purchase_orders", sim.purchase_orders, _fila_orden_compra)
+            conn.executemany(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                _eventos_nuevos(conn, sim.events)
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [("instancia", sim.instancia), ("version", sim.version)]
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return True
+
+
+def necesita_sincronizar(sim, ruta=DB_FILE):
+    """True si el índice no existe o va por detrás del estado cargado en `sim`."""
+    if not os.path.exists(ruta):
+        return True
+    try:
+        with closing(_conectar(ruta)) as conn:
+            instancia, version = _version_indexada(conn)
+    except sqlite3.OperationalError:
+        return True  # índice de una versión anterior, sin tabla meta
+    return instancia != sim.instancia or version is None or version < sim.version
+
+
+def _consultar(tabla, filtros, desde=None, hasta=None, pagina=1, por_pagina=20, descendente=True, ruta=DB_FILE):
+    condiciones = []
+    parametros = []
+    for columna, valor in filtros.items():
+        if valor is not None:
+            condiciones.append(f"{columna} = ?")
+            parametros.append(valor)
+
+    campo_fecha = _CAMPO_FECHA[tabla]
+    if desde is not None:
+        condiciones.append(f"{campo_fecha} >= ?")
+        parametros.append(desde.isoformat())
+    if hasta is not None:
+        condiciones.append(f"{campo_fecha} <= ?")
+        parametros.append(hasta.isoformat())
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    orden = "DESC" if descendente else "ASC"
+    pagina = max(1, pagina)
+
+    with closing(_conectar(ruta)) as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM {tabla} {where}", parametros).fetchone()[0]
+        filas = conn.execute(
+            f"SELECT * FROM {tabla} {where} ORDER BY id {orden} LIMIT ? OFFSET ?",
+            parametros + [por_pagina, (pagina - 1) * por_pagina]
+        ).fetchall()
+
+    return [dict(fila) for fila in filas], total
+
+
+def consultar_pedidos(status=None, product_id=None, desde=None, hasta=None, pagina=1, por_pagina=20,
+                      descendente=True, ruta=DB_FILE):
+    """Devuelve (filas, total) de pedidos de cliente, filtrando por fecha de entrega."""
+    filtros = {"status": status, "product_id": product_id}
+    return _consultar("orders", filtros, desde, hasta, pagina, por_pagina, descendente, ruta)
+
+
+def consultar_ordenes_compra(status=None, product_id=None, supplier_id=None, desde=None, hasta=None,
+                             pagina=1, por_pagina=20, ruta=DB_FILE):
+    """Devuelve (filas, total) de órdenes de compra, filtrando por fecha de orden."""
+    filtros = {"status": status, "product_id": product_id, "supplier_id": supplier_id}
+    return _consultar("purchase_orders", filtros, desde, hasta, pagina, por_pagina, ruta=ruta)
+
+
+def consultar_eventos(tipo=None, product_id=None, supplier_id=None, desde=None, hasta=None,
+                      pagina=1, por_pagina=20, ruta=DB_FILE):
+    """Devuelve (filas, total) del registro de eventos, filtrando por fecha simulada."""
+    filtros = {"type": tipo, "product_id": product_id, "supplier_id": supplier_id}
+    return _consultar("events", filtros, desde, hasta, pagina, por_pagina, ruta=ruta)
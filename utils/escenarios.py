@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from utils.estado import ESTADO_FILE, estado_a_dict, aplicar_estado, bloquear_archivo
+
+# Ejecución de escenarios "qué pasaría si" sin tocar estado.json, con una caché
+# en disco direccionada por contenido: la clave es un hash de la configuración,
+# del estado de partida (cuyo contenido incluye su versión) y de los
+# parámetros del avance, incluida la semilla. Un escenario idéntico se devuelve
+# sin simular, y uno más largo que otro ya calculado continúa desde su
+# checkpoint.
+#
+# Con liberacion_automatica el planificador decide cada día qué pedidos
+# liberar, para comparar su política con la liberación manual.
+CACHE_DIR = "./data/cache_escenarios"
+MAX_ENTRADAS = 200
+MAX_BYTES = 500 * 1024 * 1024
+
+
+def _hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def clave_escenario(base, dias=None):
+    """Clave de un escenario de `dias` días; sin `dias`, la de sus parámetros comunes."""
+    contenido = json.dumps(base if dias is None else base | {"dias": dias}, sort_keys=True)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheEscenarios:
+    """Caché LRU de resultados en disco, con límite de entradas y de tamaño total.
+
+    Un índice (indice.json) anota, para cada clave de parámetros comunes, qué
+    número de días está guardado y con qué clave: así se encuentra el
+    checkpoint más cercano sin probar una clave por cada día.
+    """
+
+    INDICE = "indice.json"
+
+    def __init__(self, directorio=CACHE_DIR, max_entradas=MAX_ENTRADAS, max_bytes=MAX_BYTES):
+        self.directorio = directorio
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ruta_indice = os.path.join(directorio, self.INDICE)
+        self.ruta_lock = os.path.join(directorio, "indice.lock")
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.json")
+
+    def _escribir(self, ruta, datos):
+        # Temporal con nombre único: dos sesiones pueden guardar la misma clave a la vez
+        descriptor, temporal = tempfile.mkstemp(suffix=".tmp", dir=self.directorio)
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            f.write(json.dumps(datos, ensure_ascii=False))
+        os.replace(temporal, ruta)
+
+    def _leer_indice(self):
+        try:
+            with open(self.ruta_indice, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def dias_guardados(self, grupo):
+        """{días: clave} de las entradas guardadas con la clave de parámetros `grupo`."""
+        return {int(dias): clave for dias, clave in self._leer_indice().get(grupo, {}).items()}
+
+    def obtener(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # La fecha de modificación hace de marca de último uso para el LRU
+        os.utime(ruta)
+        return datos
+
+    def guardar(self, clave, datos, grupo=None, dias=None):
+        """Guarda una entrada; con `grupo` y `dias` la anota además en el índice."""
+        self._escribir(self._ruta(clave), datos)
+        # El índice se lee y reescribe entero: con el bloqueo, para que otra
+        # sesión no pierda sus anotaciones
+        with bloquear_archivo(self.ruta_lock):
+            indice = self._leer_indice()
+            if grupo is not None:
+                indice.setdefault(grupo, {})[str(dias)] = clave
+            desalojadas = self._desalojar()
+            if desalojadas:
+                for grupo_indice in list(indice):
+                    dias_grupo = {d: c for d, c in indice[grupo_indice].items() if c not in desalojadas}
+                    if dias_grupo:
+                        indice[grupo_indice] = dias_grupo
+                    else:
+                        del indice[grupo_indice]
+            self._escribir(self.ruta_indice, indice)
+
+    def _desalojar(self):
+        """Borra las entradas menos usadas hasta cumplir los límites; devuelve sus claves."""
+        entradas = [e for e in os.scandir(self.directorio) if e.name.endswith(".json") and e.name != self.INDICE]
+        entradas.sort(key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entradas)
+        desalojadas = set()
+        while entradas and (len(entradas) > self.max_entradas or total > self.max_bytes):
+            entrada = entradas.pop(0)
+            total -= entrada.stat().st_size
+            try:
+                os.remove(entrada.path)
+            except FileNotFoundError:
+                pass  # otro proceso ya la desalojó
+            desalojadas.add(entrada.name[:-len(".json")])
+        return desalojadas
+
+
+def calcular_kpis(sim):
+    """Indicadores del estado final de un escenario."""
+    completado_en = {
+        e.order_id: e.sim_date for e in sim.events
+        if e.type == "production" and e.description == "Pedido completado en producción"
+    }
+
+    retraso_total = 0
+    retrasados = 0
+    for o in sim.orders:
+        if o.delivery_date is None:
+            continue
+        fin = completado_en.get(o.id) if o.status == "completed" else sim.current_date
+        if fin is not None and fin > o.delivery_date:
+            retrasados += 1
+            retraso_total += (fin - o.delivery_date).days
+
+    return {
+        "dia": sim.day,
+        "fecha": sim.current_date.isoformat(),
+        "pedidos_completados": sum(1 for o in sim.orders if o.status == "completed"),
+        "pedidos_pendientes": sum(1 for o in sim.orders if o.status == "pending"),
+        "pedidos_liberados": sum(1 for o in sim.orders if o.status == "released"),
+        "pedidos_retrasados": retrasados,
+        "retraso_total_dias": retraso_total,
+        "unidades_producidas": sum(sum(log["produced"].values()) for log in sim.production_log),
+        "ordenes_compra_abiertas": sum(1 for po in sim.purchase_orders if po.status == "ordered"),
+        "inventario_total": sum(sim.inventory.values()),
+    }
+
+
+def _checkpoint(sim):
+    return {"estado": estado_a_dict(sim), "rng": sim.rng.getstate(), "kpis": calcular_kpis(sim)}
+
+
+def ejecutar_escenario(dias, media=5, desviacion=2, tiempo_base_entrega=3, capacidad=10, semilla=0,
+                       ruta_config="data/configuracion.json", ruta_estado=ESTADO_FILE,
+                       cache=None, checkpoint_cada=None, liberacion_automatica=False, progreso=None):
+    """Simula `dias` días desde el estado guardado, sin modificarlo.
+
+    Devuelve {"kpis", "estado", "desde_cache", "dia_reanudado"}. Sin semilla
+    la simulación no es reproducible y no se usa la caché. Con checkpoint_cada
+    se guardan también estados intermedios desde los que otros escenarios más
+    largos pueden continuar. Con liberacion_automatica, antes de cada día
+    se liberan los pedidos que indique el planificador. `progreso(dia)` se
+    llama tras simular cada día.
+    """
+    import simpy
+    from simulator import Simulator
+    from utils.loader import cargar_configuracion, cargar_lineas
+    from utils.planificador import INTERCAMBIOS_PLAN_DIARIO, planificar, aplicar_plan
+
+    if cache is None and semilla is not None:
+        cache = CacheEscenarios()
+
+    # Una sola lectura de estado.json para la clave y para la simulación: si
+    # el worker lo guarda entremedias, el resultado no puede acabar en la
+    # caché con la clave del estado anterior
+    with open(ruta_estado, "rb") as f:
+        contenido_estado = f.read()
+
+    base = {
+        "config": _hash_archivo(ruta_config),
+        "estado": hashlib.sha256(contenido_estado).hexdigest(),
+        "media": media,
+        "desviacion": desviacion,
+        "tiempo_base_entrega": tiempo_base_entrega,
+        "capacidad": capacidad,
+        "semilla": semilla,
+        "liberacion_automatica": liberacion_automatica,
+        # El plan diario depende del límite de intercambios del planificador
+        "intercambios": INTERCAMBIOS_PLAN_DIARIO if liberacion_automatica else None,
+    }
+    usar_cache = semilla is not None
+    grupo = clave_escenario(base)
+
+    if usar_cache:
+        resultado = cache.obtener(clave_escenario(base, dias))
+        if resultado is not None:
+            return {"kpis": resultado["kpis"], "estado": resultado["estado"], "desde_cache": True, "dia_reanudado": dias}
+
+    sim = Simulator(simpy.Environment(), daily_capacity=capacidad, seed=semilla)
+    sim.products, sim.boms, sim.suppliers = cargar_configuracion(ruta_config)
+    sim.lines = cargar_lineas(ruta_config)
+    aplicar_estado(sim, json.loads(contenido_estado))
+
+    # Prefijo más largo ya calculado para estos mismos parámetros
+    inicio = 0
+    if usar_cache:
+        guardados = cache.dias_guardados(grupo)
+        for k in sorted((k for k in guardados if k < dias), reverse=True):
+            checkpoint = cache.obtener(guardados[k])
+            if checkpoint is not None:
+                aplicar_estado(sim, checkpoint["estado"])
+                version, estado_interno, gauss_next = checkpoint["rng"]
+                sim.rng.setstate((version, tuple(estado_interno), gauss_next))
+                inicio = k
+                break
+
+    for dia in range(inicio + 1, dias + 1):
+        if liberacion_automatica:
+            aplicar_plan(sim, planificar(sim, intercambios=INTERCAMBIOS_PLAN_DIARIO))
+        sim.advance_day(media=media, desviacion=desviacion, tiempo_base_entrega=tiempo_base_entrega)
+        if progreso:
+            progreso(dia)
+        if usar_cache and (dia == dias or (checkpoint_cada and dia % checkpoint_cada == 0)):
+            cache.guardar(clave_escenario(base, dia), _checkpoint(sim), grupo, dia)
+
+    return {"kpis": calcular_kpis(sim), "estado": estado_a_dict(sim), "desde_cache": False, "dia_reanudado": inicio}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simula un escenario desde el estado guardado, con caché")
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--media", type=int, default=5)
+    parser.add_argument("--desviacion", type=int, default=2)
+    parser.add_argument("--tiempo-base-entrega", type=int, default=3)
+    parser.add_argument("--capacidad", type=int, default=10)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--checkpoint-cada", type=int, default=None)
+    parser.add_argument("--liberacion-automatica", action="store_true", help="liberar según el planificador")
+    args = parser.parse_args()
+
+    resultado = ejecutar_escenario(
+        args.dias, args.media, args.desviacion, args.tiempo_base_entrega, args.capacidad, args.semilla,
+        checkpoint_cada=args.checkpoint_cada, liberacion_automatica=args.liberacion_automatica
+    )
+    origen = "caché" if resultado["desde_cache"] else f"simulado desde el día {resultado['dia_reanudado']}"
+    print(f"Escenario ({origen}):")
+    print(json.dumps(resultado["kpis"], indent=2, ensure_ascii=False))
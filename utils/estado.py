@@ -0,0 +1,217 @@
+import json
+import os
+import uuid
+import simpy
+from contextlib import contextmanager
+from datetime import datetime
+from models import Order, PurchaseOrder, Event
+from simulator import Simulator
+from utils.loader import cargar_configuracion, cargar_lineas
+from utils.consultas import DB_FILE, sincronizar
+
+# ===== Persistencia =====
+ESTADO_FILE = "./data/estado.json"
+
+
+def estado_a_dict(sim):
+    """Serializa el estado dinámico del simulador (sin el catálogo) a un dict JSON."""
+    return {
+        "instancia": sim.instancia,
+        "version": sim.version,
+        "day": sim.day,
+        "current_date": sim.current_date.isoformat(),
+        "inventory": sim.inventory,
+        "orders": [o.dict() | {"creation_date": o.creation_date.isoformat(),
+                       "delivery_date": o.delivery_date.isoformat() if o.delivery_date else None,
+                       "initial_quantity": o.initial_quantity}
+            for o in sim.orders],
+        "purchase_orders": [
+            po.dict() | {
+                "order_date": po.order_date.isoformat(),
+                "expected_arrival": po.expected_arrival.isoformat()
+            } for po in sim.purchase_orders
+        ],
+        "events": [e.dict() | {"sim_date": e.sim_date.isoformat()} for e in sim.events],
+        "inventory_history": [
+            {
+                "date": entry["date"].isoformat(),
+                "inventory": entry["inventory"]
+            }
+            for entry in sim.inventory_history
+        ],
+        "production_log": [
+            {
+                "date": log["date"].isoformat(),
+                "produced": log["produced"]
+            } for log in sim.production_log
+        ]
+    }
+
+
+def aplicar_estado(sim, estado):
+    """Carga en el simulador un estado producido por estado_a_dict."""
+    sim.instancia = estado.get("instancia")
+    sim.version = estado.get("version", 0)
+    sim.day = estado["day"]
+    sim.current_date = datetime.fromisoformat(estado["current_date"]).date()
+    sim.inventory = {int(k): v for k, v in estado["inventory"].items()}
+    sim.orders = [Order(**{
+        **o,
+        "creation_date": datetime.fromisoformat(o["creation_date"]).date(),
+        "delivery_date": datetime.fromisoformat(o["delivery_date"]).date() if o.get("delivery_date") else None,
+        "initial_quantity": o.get("initial_quantity", o["quantity"])
+
+    }) for o in estado["orders"]]
+    sim.purchase_orders = [
+        PurchaseOrder(**{
+            **po,
+            "order_date": datetime.fromisoformat(po["order_date"]).date(),
+            "expected_arrival": datetime.fromisoformat(po["expected_arrival"]).date()
+        }) for po in estado["purchase_orders"]
+    ]
+    sim.events = [Event(**{**e, "sim_date": datetime.fromisoformat(e["sim_date"]).date()}) for e in estado["events"]]
+    sim.inventory_history = [{
+            "date": datetime.fromisoformat(entry["date"]).date(),
+            "inventory": {int(k): v for k, v in entry["inventory"].items()}
+        }
+        for entry in estado.get("inventory_history", [])
+    ]
+    sim.production_log = [
+        {
+            "date": datetime.fromisoformat(log["date"]).date(),
+            "produced": log.get("produced", {})
+        } for log in estado.get("production_log", [])
+    ]
+
+
+def existe_estado(ruta=ESTADO_FILE):
+    return os.path.exists(ruta) and os.path.getsize(ruta) > 0
+
+
+def guardar_estado(sim, ruta=ESTADO_FILE, ruta_indice=DB_FILE):
+    # La versión vuelve a empezar si el estado se reinicia: (instancia, versión)
+    # es lo que identifica de forma única un estado guardado
+    if sim.instancia is None:
+        sim.instancia = uuid.uuid4().hex
+    sim.version += 1
+    estado = estado_a_dict(sim)
+
+    # Escritura atómica: quien lea el archivo mientras se guarda (otra sesión o
+    # el worker de simulación) ve siempre el estado anterior completo o el nuevo.
+    temporal = f"{ruta}.tmp"
+    # json.dumps sin sangría usa el codificador en C: con historiales grandes
+    # (p. ej. tras una importación masiva) es varias veces más rápido
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(json.dumps(estado, ensure_ascii=False))
+    os.replace(temporal, ruta)
+    if ruta_indice:
+        sincronizar(sim, ruta_indice)
+
+
+def cargar_estado(sim, ruta=ESTADO_FILE):
+    """Carga el estado guardado si existe. Lanza json.JSONDecodeError si está corrupto."""
+    if existe_estado(ruta):
+        with open(ruta, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+        aplicar_estado(sim, estado)
+
+
+# ===== Acceso concurrente =====
+class ConflictoVersion(Exception):
+    """El estado cambió desde que el usuario lo consultó y la operación no se puede fusionar."""
+
+
+@contextmanager
+def bloquear_archivo(ruta_lock):
+    # Bloqueo exclusivo entre procesos (varias instancias de Streamlit o scripts)
+    with open(ruta_lock, "a+") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK se rinde tras 10 s: seguimos esperando
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ServicioEstado:
+    """Serializa las modificaciones de estado.json entre sesiones y procesos.
+
+    Las lecturas no toman el bloqueo (el guardado es atómico). Cada modificación
+    se hace dentro de transaccion(): con el bloqueo tomado se parte siempre del
+    estado más reciente en disco, se aplica el cambio y se guarda con una
+    versión nueva. Si la operación se decidió sobre una versión que ya no es la
+    actual, se rechaza con ConflictoVersion.
+    """
+
+    def __init__(self, ruta_config="data/configuracion.json", ruta_estado=ESTADO_FILE, ruta_indice=DB_FILE):
+        self.ruta_config = ruta_config
+        self.ruta_estado = ruta_estado
+        self.ruta_indice = ruta_indice
+        self.ruta_lock = f"{ruta_estado}.lock"
+        self._sim = None
+        self._firma = None
+
+    def _firma_archivo(self):
+        # Cambia con cada guardado, propio o de otro proceso (os.replace crea un inodo nuevo)
+        if not os.path.exists(self.ruta_estado):
+            return None
+        st = os.stat(self.ruta_estado)
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def _simulador_actual(self):
+        firma = self._firma_archivo()
+        if self._sim is None or firma != self._firma:
+            sim = Simulator(simpy.Environment())
+            sim.products, sim.boms, sim.suppliers = cargar_configuracion(self.ruta_config)
+            sim.lines = cargar_lineas(self.ruta_config)
+            cargar_estado(sim, self.ruta_estado)
+            self._sim = sim
+            self._firma = firma
+        return self._sim
+
+    def leer(self):
+        """Simulador con el estado más reciente, sólo para consulta (sin bloqueo)."""
+        return self._simulador_actual()
+
+    def sincronizar_indice(self):
+        """Reconstruye el índice SQLite si va por detrás del estado en disco.
+
+        Se hace con el bloqueo tomado: así nadie puede estar entre la escritura
+        de estado.json y la del índice, y el simulador es el último guardado.
+        """
+        with bloquear_archivo(self.ruta_lock):
+            sincronizar(self._simulador_actual(), self.ruta_indice)
+
+    @contextmanager
+    def transaccion(self, version_base=None):
+        """Entrega el simulador con el estado más reciente y lo guarda al salir sin errores."""
+        with bloquear_archivo(self.ruta_lock):
+            sim = self._simulador_actual()
+            if version_base is not None and version_base != sim.version:
+                raise ConflictoVersion(
+                    f"el estado cambió (versión {version_base} → {sim.version}); revisa los datos y vuelve a intentarlo"
+                )
+            try:
+                yield sim
+                guardar_estado(sim, self.ruta_estado, self.ruta_indice)
+            except BaseException:
+                # El simulador en memoria puede haber quedado a medias (o con
+                # cambios que no se llegaron a guardar): se recarga del disco
+                self._sim = None
+                raise
+            self._firma = self._firma_archivo()
@@ -0,0 +1,71 @@
+import io
+import math
+
+# Número máximo de puntos que se dibujan por serie, sea cual sea la longitud del historial
+MAX_PUNTOS = 300
+
+
+def series_por_producto(inventory_history):
+    """Agrupa el historial de inventario en {product_id: (fechas, cantidades)} en una sola pasada."""
+    series = {}
+    for entrada in inventory_history:
+        fecha = entrada["date"]
+        for pid, cantidad in entrada["inventory"].items():
+            fechas, cantidades = series.setdefault(pid, ([], []))
+            fechas.append(fecha)
+            cantidades.append(cantidad)
+    return series
+
+
+def reducir_serie(fechas, valores, max_puntos=MAX_PUNTOS):
+    # Submuestreo min/max por tramo: cada tramo aporta su mínimo y su máximo en
+    # orden cronológico, así los picos y roturas de stock siguen siendo visibles.
+    n = len(valores)
+    if n <= max_puntos:
+        return list(fechas), list(valores)
+
+    tamano_tramo = math.ceil(n / (max_puntos // 2))
+    fechas_red, valores_red = [], []
+    for inicio in range(0, n, tamano_tramo):
+        fin = min(inicio + tamano_tramo, n)
+        i_min = min(range(inicio, fin), key=valores.__getitem__)
+        i_max = max(range(inicio, fin), key=valores.__getitem__)
+        for i in sorted({i_min, i_max}):
+            fechas_red.append(fechas[i])
+            valores_red.append(valores[i])
+    return fechas_red, valores_red
+
+
+def dibujar_inventario(series, nombres):
+    """Dibuja las series {product_id: (fechas, cantidades)} superpuestas y devuelve un PNG."""
+    # Se usa Figure directamente (sin pyplot) para no depender del estado global
+    # de matplotlib ni tener que cerrar figuras.
+    from matplotlib.figure import Figure
+    import matplotlib.dates as mdates
+    import matplotlib.ticker as ticker
+
+    fig = Figure()
+    ax = fig.subplots()
+    for pid, (fechas, cantidades) in series.items():
+        ax.plot(fechas, cantidades, marker='o' if len(fechas) <= 60 else None, label=nombres.get(pid, "Desconocido"))
+
+    if len(series) == 1:
+        pid = next(iter(series))
+        ax.set_title(f"Inventario de {nombres.get(pid, 'Desconocido')}")
+    else:
+        ax.set_title("Inventario histórico")
+        ax.legend()
+    ax.set_xlabel("Fecha")
+    ax.set_ylabel("Unidades")
+    # Formatear eje X para mostrar día y mes, o mes y año en historiales largos
+    fechas_todas = [f for fechas, _ in series.values() if fechas for f in (fechas[0], fechas[-1])]
+    largo = fechas_todas and (max(fechas_todas) - min(fechas_todas)).days > 365
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%Y' if largo else '%d-%m'))
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.yaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+    fig.autofmt_xdate()  # rota ligeramente las etiquetas
+    ax.grid(True)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
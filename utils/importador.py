@@ -0,0 +1,272 @@
+import argparse
+import csv
+import json
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from itertools import islice
+from models import Order, PurchaseOrder
+from utils.estado import ServicioEstado
+
+# Importación masiva de pedidos de cliente y órdenes de compra desde CSV o
+# JSONL. El archivo se lee en streaming y se valida por lotes. Todo se aplica
+# dentro de una única transacción de ServicioEstado: si alguna fila es
+# inválida no se importa nada.
+TAMANO_LOTE = 10_000
+MAX_ERRORES = 20
+
+ESTADOS_PEDIDO = {"pending", "released", "in_production", "completed"}
+ESTADOS_COMPRA = {"ordered", "received"}
+
+
+class ErrorImportacion(Exception):
+    def __init__(self, errores):
+        self.errores = errores
+        super().__init__(f"{len(errores)} fila(s) con errores; no se ha importado nada:\n" + "\n".join(errores))
+
+
+def leer_filas(ruta):
+    """Genera (número de línea, fila) sin cargar el archivo completo en memoria.
+
+    En JSONL la fila es el texto de la línea: se decodifica al validarla, para
+    que una línea mal formada se informe como error de esa línea.
+    """
+    # utf-8-sig: Excel guarda los CSV con BOM, que si no acabaría en el nombre
+    # de la primera columna
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+        if ruta.endswith(".jsonl"):
+            for num, linea in enumerate(f, start=1):
+                if linea.strip():
+                    yield num, linea
+        else:
+            # La línea 1 es la cabecera
+            for num, fila in enumerate(csv.DictReader(f), start=2):
+                yield num, fila
+
+
+def _lotes(filas, tamano):
+    filas = iter(filas)
+    while lote := list(islice(filas, tamano)):
+        yield lote
+
+
+def _vacio(valor):
+    return valor is None or valor == ""
+
+
+def _entero(fila, campo, defecto=None):
+    valor = fila.get(campo)
+    if _vacio(valor):
+        if defecto is None:
+            raise ValueError(f"falta '{campo}'")
+        return defecto
+    # Sólo enteros o texto con un entero: int() truncaría 2.7 y aceptaría True
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ValueError(f"'{campo}' debe ser un número entero")
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValueError(f"'{campo}' debe ser un número entero") from None
+
+
+def _fecha(fila, campo, defecto=None):
+    valor = fila.get(campo)
+    return defecto if _vacio(valor) else date.fromisoformat(valor)
+
+
+def _validar_lote(lote, validar_fila, errores):
+    validas = []
+    for num, fila in lote:
+        try:
+            if isinstance(fila, str):
+                try:
+                    fila = json.loads(fila.rstrip("\r\n"))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"JSON no válido: {e.msg} (columna {e.colno})")
+            if not isinstance(fila, dict):
+                raise ValueError("la línea no es un objeto JSON")
+            validas.append(validar_fila(fila))
+        except (ValueError, TypeError, KeyError) as e:
+            if len(errores) < MAX_ERRORES:
+                errores.append(f"línea {num}: {e}")
+    return validas
+
+
+# ===== Pedidos de cliente =====
+def importar_pedidos(ruta, servicio=None, tamano_lote=TAMANO_LOTE):
+    """Importa pedidos (product_id, quantity[, creation_date, delivery_date, status]).
+
+    Los IDs se asignan a continuación de los existentes. Devuelve un resumen
+    con el número de pedidos importados y su reparto por estado.
+    """
+    servicio = servicio or ServicioEstado()
+    with servicio.transaccion() as sim:
+        terminados = {p.id for p in sim.products if p.type == "finished"}
+
+        def validar_fila(fila):
+            product_id = _entero(fila, "product_id")
+            if product_id not in terminados:
+                raise ValueError(f"producto {product_id} no es un producto terminado")
+            cantidad = _entero(fila, "quantity")
+            if cantidad <= 0:
+                raise ValueError("'quantity' debe ser positiva")
+            status = fila.get("status") or "pending"
+            if status not in ESTADOS_PEDIDO:
+                raise ValueError(f"estado desconocido '{status}'")
+            creacion = _fecha(fila, "creation_date", sim.current_date)
+            return product_id, cantidad, status, creacion, _fecha(fila, "delivery_date")
+
+        errores = []
+        nuevos = []
+        por_estado = Counter()
+        siguiente_id = len(sim.orders) + 1
+        for lote in _lotes(leer_filas(ruta), tamano_lote):
+            for product_id, cantidad, status, creacion, entrega in _validar_lote(lote, validar_fila, errores):
+                # Ya validado: se construye sin volver a pasar por pydantic
+                nuevos.append(Order.construct(
+                    id=siguiente_id,
+                    creation_date=creacion,
+                    product_id=product_id,
+                    quantity=0 if status == "completed" else cantidad,
+                    status=status,
+                    delivery_date=entrega,
+                    initial_quantity=cantidad
+                ))
+                por_estado[status] += 1
+                siguiente_id += 1
+
+        if errores:
+            raise ErrorImportacion(errores)
+
+        sim.orders.extend(nuevos)
+        sim.log_event(
+            event_type="order",
+            description="Importación masiva de pedidos",
+            quantity=len(nuevos),
+            extra={"archivo": ruta, "por_estado": dict(por_estado)}
+        )
+
+    return {"importados": len(nuevos), "por_estado": dict(por_estado), "version": sim.version}
+
+
+# ===== Órdenes de compra y confirmaciones de proveedor =====
+def importar_ordenes_compra(ruta, servicio=None, tamano_lote=TAMANO_LOTE):
+    """Importa órdenes de compra (supplier_id, quantity[, product_id, order_date,
+    expected_arrival, status]).
+
+    Una fila con "id" es una confirmación del proveedor: actualiza la cantidad
+    y la fecha de llegada de esa orden, que debe existir y no estar recibida.
+    Las órdenes con estado "received" suman su cantidad al inventario.
+    Devuelve un resumen con las órdenes creadas, las confirmadas y las
+    llegadas previstas por fecha.
+    """
+    servicio = servicio or ServicioEstado()
+    with servicio.transaccion() as sim:
+        proveedores = {s.id: s for s in sim.suppliers}
+        existentes = {po.id: po for po in sim.purchase_orders}
+
+        def validar_fila(fila):
+            po_id = None if _vacio(fila.get("id")) else _entero(fila, "id")
+            if po_id is not None and po_id not in existentes:
+                # Un id con una errata crearía una orden duplicada
+                raise ValueError(f"la orden {po_id} no existe")
+            if po_id is not None:
+                po = existentes[po_id]
+                if po.status != "ordered":
+                    raise ValueError(f"la orden {po_id} ya se ha recibido")
+                cantidad = _entero(fila, "quantity", po.quantity)
+                if cantidad <= 0:
+                    raise ValueError("'quantity' debe ser positiva")
+                return po_id, None, po.product_id, cantidad, po.order_date, \
+                    _fecha(fila, "expected_arrival", po.expected_arrival), po.status
+
+            proveedor = proveedores.get(_entero(fila, "supplier_id"))
+            if proveedor is None:
+                raise ValueError(f"proveedor {fila.get('supplier_id')} desconocido")
+            product_id = _entero(fila, "product_id", proveedor.product_id)
+            if product_id != proveedor.product_id:
+                raise ValueError(f"el proveedor {proveedor.id} no suministra el producto {product_id}")
+            cantidad = _entero(fila, "quantity")
+            if cantidad <= 0:
+                raise ValueError("'quantity' debe ser positiva")
+            status = fila.get("status") or "ordered"
+            if status not in ESTADOS_COMPRA:
+                raise ValueError(f"estado desconocido '{status}'")
+            pedido = _fecha(fila, "order_date", sim.current_date)
+            llegada = _fecha(fila, "expected_arrival", pedido + timedelta(days=proveedor.lead_time))
+            return None, proveedor.id, product_id, cantidad, pedido, llegada, status
+
+        errores = []
+        nuevas = []
+        confirmaciones = {}
+        llegadas = defaultdict(int)
+        siguiente_id = len(sim.purchase_orders) + 1
+        for lote in _lotes(leer_filas(ruta), tamano_lote):
+            for po_id, supplier_id, product_id, cantidad, pedido, llegada, status in \
+                    _validar_lote(lote, validar_fila, errores):
+                if po_id is not None:
+                    confirmaciones[po_id] = (cantidad, llegada)
+                else:
+                    nuevas.append(PurchaseOrder.construct(
+                        id=siguiente_id,
+                        supplier_id=supplier_id,
+                        product_id=product_id,
+                        quantity=cantidad,
+                        order_date=pedido,
+                        expected_arrival=llegada,
+                        status=status
+                    ))
+                    siguiente_id += 1
+                if status == "ordered":
+                    llegadas[llegada.isoformat()] += cantidad
+
+        if errores:
+            raise ErrorImportacion(errores)
+
+        for po_id, (cantidad, llegada) in confirmaciones.items():
+            po = existentes[po_id]
+            po.quantity = cantidad
+            po.expected_arrival = llegada
+        sim.purchase_orders.extend(nuevas)
+        # Las órdenes que llegan ya recibidas no pasan por process_purchases:
+        # su recepción (stock y evento) se registra aquí
+        for po in nuevas:
+            if po.status == "received":
+                sim.inventory[po.product_id] = sim.inventory.get(po.product_id, 0) + po.quantity
+                sim.log_event(
+                    event_type="purchase",
+                    description="Recepción de orden de compra",
+                    product_id=po.product_id,
+                    supplier_id=po.supplier_id,
+                    quantity=po.quantity,
+                    extra={
+                        "purchase_order_id": po.id,
+                        "expected_arrival": po.expected_arrival.isoformat()
+                    }
+                )
+        sim.log_event(
+            event_type="purchase",
+            description="Importación masiva de órdenes de compra",
+            quantity=len(nuevas),
+            extra={"archivo": ruta, "confirmadas": len(confirmaciones)}
+        )
+
+    return {
+        "creadas": len(nuevas),
+        "confirmadas": len(confirmaciones),
+        "llegadas": dict(sorted(llegadas.items())),
+        "version": sim.version,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importación masiva de pedidos u órdenes de compra")
+    parser.add_argument("tipo", choices=["pedidos", "compras"])
+    parser.add_argument("archivo", help="archivo .csv o .jsonl")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="filas validadas por lote")
+    args = parser.parse_args()
+
+    importar = importar_pedidos if args.tipo == "pedidos" else importar_ordenes_compra
+    try:
+        print(importar(args.archivo, tamano_lote=args.lote))
+    except ErrorImportacion as e:
+        raise SystemExit(str(e))
@@ -1,4 +1,4 @@
-from models import Product, BOMItem, Supplier
+from models import Product, BOMItem, Supplier, ProductionLine, Plant, Transfer
 import json
 
 def cargar_configuracion(filepath="data/configuracion.json"):
@@ -9,4 +9,22 @@ def cargar_configuracion(filepath="data/configuracion.json"):
     boms = [BOMItem(**b) for b in data.get("boms", [])]
     suppliers = [Supplier(**s) for s in data.get("suppliers", [])]
 
-    return products, boms, suppliers
\ No newline at end of file
+    return products, boms, suppliers
+
+def cargar_lineas(filepath="data/configuracion.json"):
+    # Sección opcional "lines": si no existe, la planta usa un único pool de capacidad
+    with open(filepath, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    return [ProductionLine(**l) for l in data.get("lines", [])]
+
+def cargar_red(filepath="data/red.json"):
+    # Red de plantas: plantas, capacidad diaria de los proveedores compartidos y transferencias programadas
+    with open(filepath, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    plants = [Plant(**p) for p in data.get("plants", [])]
+    shared_suppliers = {int(k): v for k, v in data.get("shared_suppliers", {}).items()}
+    transfers = [Transfer(**t) for t in data.get("transfers", [])]
+
+    return plants, shared_suppliers, transfers
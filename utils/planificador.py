@@ -0,0 +1,346 @@
+import argparse
+import heapq
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+# Planificador de liberación y producción. A partir de los pedidos pendientes
+# y liberados, el inventario, las compras en camino, la capacidad diaria (o
+# las líneas) y las fechas de entrega, calcula en qué orden fabricar para
+# minimizar el retraso total:
+#
+# 1. Programación por lista en orden EDD (fecha de entrega más temprana). Los
+#    pedidos ya liberados van primero, como en Simulator.process_production.
+#    Cada pedido reserva sus materiales sobre la curva acumulada de stock +
+#    llegadas, y ocupa capacidad desde el día en que tiene todo el material.
+# 2. Reparación: secuencia alternativa por fecha de entrega modificada (MDD)
+#    y, hasta agotar un número máximo de evaluaciones, intercambios de pedidos
+#    contiguos; sólo se aceptan los cambios que reducen el retraso total.
+#
+# El límite es un número de evaluaciones y no un tiempo: con los mismos datos
+# el plan es siempre el mismo, sea cual sea la máquina o su carga, y los
+# escenarios y la red de plantas con semilla son reproducibles.
+#
+# El día 0 del plan es el próximo advance_day (fecha actual + 1).
+MAX_INTERCAMBIOS = 50  # intercambios evaluados como máximo en la reparación
+INTERCAMBIOS_PLAN_DIARIO = 0  # al planificar cada día simulado: sólo EDD y MDD
+
+
+class _Calendario:
+    """Capacidad restante por día de un pool; salta los días llenos en O(α(n))."""
+
+    def __init__(self, capacidad_diaria):
+        self.capacidad_diaria = capacidad_diaria
+        self.restante = []
+        self.siguiente = []  # union-find: siguiente día con capacidad libre
+
+    def _buscar(self, dia):
+        while len(self.restante) <= dia:
+            self.restante.append(self.capacidad_diaria)
+            self.siguiente.append(len(self.siguiente))
+        raiz = dia
+        while self.siguiente[raiz] != raiz:
+            raiz = self.siguiente[raiz]
+            if raiz >= len(self.siguiente):
+                self.restante.append(self.capacidad_diaria)
+                self.siguiente.append(raiz)
+        while self.siguiente[dia] != raiz:
+            self.siguiente[dia], dia = raiz, self.siguiente[dia]
+        return raiz
+
+    def primer_dia_libre(self, desde):
+        return self._buscar(desde)
+
+    def asignar(self, desde, cantidad):
+        """Ocupa `cantidad` unidades desde el día `desde`; devuelve (día inicio, día fin)."""
+        inicio = dia = self._buscar(desde)
+        while True:
+            usado = min(self.restante[dia], cantidad)
+            self.restante[dia] -= usado
+            cantidad -= usado
+            if self.restante[dia] == 0:
+                self.siguiente[dia] = dia + 1
+            if cantidad == 0:
+                return inicio, dia
+            dia = self._buscar(dia + 1)
+
+
+class _Suministro:
+    """Curva acumulada de stock + llegadas de un material."""
+
+    def __init__(self, inicial, llegadas):
+        # llegadas: {día del plan: cantidad}
+        self.dias = [0]
+        self.acumulado = [inicial + llegadas.get(0, 0)]
+        for dia in sorted(d for d in llegadas if d > 0):
+            self.dias.append(dia)
+            self.acumulado.append(self.acumulado[-1] + llegadas[dia])
+
+    def dia_disponible(self, demanda):
+        i = bisect_left(self.acumulado, demanda)
+        return self.dias[i] if i < len(self.dias) else None
+
+    def total(self):
+        return self.acumulado[-1]
+
+
+class _Datos:
+    """Datos del simulador preprocesados una vez y compartidos por todas las evaluaciones."""
+
+    def __init__(self, sim, capacidad=None):
+        self.hoy = sim.current_date + timedelta(days=1)  # fecha del día 0 del plan
+        self.bom = defaultdict(list)
+        for b in sim.boms:
+            if b.quantity > 0:
+                self.bom[b.finished_product_id].append((b.material_id, b.quantity))
+
+        self.llegadas = defaultdict(lambda: defaultdict(int))
+        for po in sim.purchase_orders:
+            if po.status == "ordered":
+                dia = max(0, (po.expected_arrival - self.hoy).days)
+                self.llegadas[po.product_id][dia] += po.quantity
+        self.inventario = dict(sim.inventory)
+
+        # Proveedor más rápido por material, para las compras sugeridas
+        self.proveedor = {}
+        for s in sim.suppliers:
+            actual = self.proveedor.get(s.product_id)
+            if actual is None or s.lead_time < actual.lead_time:
+                self.proveedor[s.product_id] = s
+
+        lineas = sim.capacidades_del_dia()
+        if capacidad is not None and not sim.lines:
+            lineas = [{"capacity": capacidad, "products": None}]
+        self.pools = [(linea["capacity"], linea["products"]) for linea in lineas if linea["capacity"] > 0]
+
+    def vencimiento(self, order):
+        # Días del plan hasta la fecha de entrega (sin fecha: al final)
+        if order.delivery_date is None:
+            return float("inf")
+        return (order.delivery_date - self.hoy).days
+
+    def programar(self, liberados, secuencia):
+        """Programa los pedidos y devuelve (resultados por pedido, compras extra, retraso total)."""
+        suministro = {}
+        extra = defaultdict(int)  # compras sugeridas por material
+        demanda = defaultdict(int)
+        calendarios = [_Calendario(capacidad) for capacidad, _ in self.pools]
+        resultados = {}
+        retraso_total = 0
+
+        def curva(mid):
+            if mid not in suministro:
+                suministro[mid] = _Suministro(self.inventario.get(mid, 0), self.llegadas.get(mid, {}))
+            return suministro[mid]
+
+        for order in liberados + secuencia:
+            pools = [i for i, (_, productos) in enumerate(self.pools) if productos is None or order.product_id in productos]
+
+            # Día en que el pedido tiene todo su material, comprando lo que falte
+            listo = 0
+            sin_proveedor = False
+            for mid, cantidad in self.bom.get(order.product_id, []):
+                demanda[mid] += cantidad * order.quantity
+                dia = curva(mid).dia_disponible(demanda[mid])
+                if dia is None:
+                    proveedor = self.proveedor.get(mid)
+                    if proveedor is None:
+                        sin_proveedor = True
+                        continue
+                    falta = demanda[mid] - curva(mid).total() - extra[mid]
+                    if falta > 0:
+                        extra[mid] += falta
+                    dia = max(0, proveedor.lead_time - 1)
+                listo = max(listo, dia)
+
+            if sin_proveedor or not pools:
+                resultados[order.id] = None
+                continue
+
+            # Pool (línea) que antes puede empezar a fabricarlo
+            pool = min(pools, key=lambda i: calendarios[i].primer_dia_libre(listo))
+            inicio, fin = calendarios[pool].asignar(listo, order.quantity)
+            retraso = max(0, fin - self.vencimiento(order))
+            retraso_total += retraso
+            resultados[order.id] = (listo, inicio, fin, retraso)
+
+        return resultados, extra, retraso_total
+
+
+def _secuencia_mdd(datos, liberados, pendientes):
+    """Secuencia por fecha de entrega modificada: max(entrega, t + duración).
+
+    Mientras un pedido llega a tiempo compite por su fecha de entrega; cuando
+    ya no llega, por lo que tarda en fabricarse, de modo que los pedidos cortos
+    adelantan a los que van muy tarde. t es el reloj de capacidad agregada
+    (sin materiales); el resultado lo evalúa después programar().
+    """
+    capacidad = sum(c for c, _ in datos.pools) or 1
+    t = sum(o.quantity for o in liberados) / capacidad
+    # "a tiempo": por fecha en que deja de llegar a tiempo (entrega - duración);
+    # "tarde": por duración
+    a_tiempo = [(datos.vencimiento(o) - o.quantity / capacidad, datos.vencimiento(o), o.id, o) for o in pendientes]
+    heapq.heapify(a_tiempo)
+    por_entrega = [(e, oid, o) for _, e, oid, o in a_tiempo]
+    heapq.heapify(por_entrega)
+    tarde = []
+    colocados = set()
+    retrasados = set()
+    secuencia = []
+    while len(secuencia) < len(pendientes):
+        while a_tiempo and a_tiempo[0][0] <= t:
+            _, _, oid, o = heapq.heappop(a_tiempo)
+            if oid not in colocados:
+                retrasados.add(oid)
+                heapq.heappush(tarde, (o.quantity, oid, o))
+        while por_entrega and (por_entrega[0][1] in colocados or por_entrega[0][1] in retrasados):
+            heapq.heappop(por_entrega)
+
+        if tarde and (not por_entrega or t + tarde[0][0] / capacidad <= por_entrega[0][0]):
+            _, oid, o = heapq.heappop(tarde)
+        else:
+            _, oid, o = heapq.heappop(por_entrega)
+        colocados.add(oid)
+        secuencia.append(o)
+        t += o.quantity / capacidad
+    return secuencia
+
+
+def planificar(sim, intercambios=MAX_INTERCAMBIOS, capacidad=None):
+    """Calcula el plan de liberación y producción que minimiza el retraso total.
+
+    Devuelve un dict con los pedidos en orden de prioridad (fechas previstas
+    de material, inicio y fin, y días de retraso), los pedidos pendientes que
+    conviene liberar hoy, las compras sugeridas para cubrir lo que ni el stock
+    ni las compras en camino alcanzan, y el retraso total previsto.
+    `intercambios` limita los intercambios evaluados en la reparación. Sin líneas, `capacidad` sustituye a sim.daily_capacity (p. ej. la que
+    ha elegido el usuario en la interfaz).
+    """
+    datos = _Datos(sim, capacidad)
+    liberados = [o for o in sim.orders if o.status == "released"]
+    pendientes = [o for o in sim.orders if o.status == "pending"]
+
+    # 1. Secuencia inicial EDD
+    secuencia = sorted(pendientes, key=lambda o: (datos.vencimiento(o), o.id))
+    resultados, extra, retraso = datos.programar(liberados, secuencia)
+
+    # 2. Secuencia alternativa por fecha de entrega modificada (MDD)
+    if retraso > 0:
+        candidata = _secuencia_mdd(datos, liberados, pendientes)
+        r, e, t = datos.programar(liberados, candidata)
+        if t < retraso:
+            secuencia, resultados, extra, retraso = candidata, r, e, t
+
+    # 3. Intercambios de pedidos contiguos cuando el segundo llega tarde,
+    #    mientras mejoren el retraso total y queden evaluaciones
+    mejorado = True
+    while mejorado and retraso > 0 and intercambios > 0:
+        mejorado = False
+        for i in range(len(secuencia) - 1):
+            if intercambios == 0:
+                break
+            siguiente = resultados.get(secuencia[i + 1].id)
+            if not siguiente or siguiente[3] == 0:
+                continue
+            intercambios -= 1
+            candidata = secuencia[:i] + [secuencia[i + 1], secuencia[i]] + secuencia[i + 2:]
+            r, e, t = datos.programar(liberados, candidata)
+            if t < retraso:
+                secuencia, resultados, extra, retraso = candidata, r, e, t
+                mejorado = True
+
+    fecha = lambda dia: datos.hoy + timedelta(days=dia)
+    pedidos = []
+    liberar = []
+    sin_planificar = []
+    for order in liberados + secuencia:
+        r = resultados[order.id]
+        if r is None:
+            sin_planificar.append(order.id)
+            continue
+        listo, inicio, fin, retraso_pedido = r
+        # Se libera hoy lo que tiene material y capacidad asignada en el día 0:
+        # liberar antes sólo haría competir por capacidad a pedidos menos urgentes
+        liberar_hoy = order.status == "pending" and listo == 0 and inicio == 0
+        if liberar_hoy:
+            liberar.append(order.id)
+        pedidos.append({
+            "order_id": order.id,
+            "product_id": order.product_id,
+            "quantity": order.quantity,
+            "status": order.status,
+            "delivery_date": order.delivery_date,
+            "material_listo": fecha(listo),
+            "inicio": fecha(inicio),
+            "fin": fecha(fin),
+            "retraso": retraso_pedido,
+            "liberar": liberar_hoy,
+        })
+
+    compras = [
+        {
+            "supplier_id": datos.proveedor[mid].id,
+            "product_id": mid,
+            "quantity": cantidad,
+            "expected_arrival": sim.current_date + timedelta(days=datos.proveedor[mid].lead_time),
+        }
+        for mid, cantidad in sorted(extra.items()) if cantidad > 0
+    ]
+
+    return {
+        "fecha": sim.current_date,
+        "version": sim.version,
+        "pedidos": pedidos,
+        "liberar": liberar,
+        "compras_sugeridas": compras,
+        "retraso_total": retraso,
+        "pedidos_retrasados": sum(1 for p in pedidos if p["retraso"] > 0),
+        "sin_planificar": sin_planificar,
+    }
+
+
+def aplicar_plan(sim, plan, liberar=True, comprar=False):
+    """Libera los pedidos del plan y, opcionalmente, emite las compras sugeridas."""
+    liberados = [oid for oid in plan["liberar"] if liberar and sim.liberar_pedido(oid)]
+    compras = []
+    if comprar:
+        proveedores = {s.id: s for s in sim.suppliers}
+        for c in plan["compras_sugeridas"]:
+            po = sim.crear_orden_compra(
+                proveedores[c["supplier_id"]], c["product_id"], c["quantity"], "Compra sugerida por el planificador"
+            )
+            compras.append(po.id)
+    return {"liberados": liberados, "compras": compras}
+
+
+if __name__ == "__main__":
+    from utils.estado import ServicioEstado
+
+    parser = argparse.ArgumentParser(description="Plan de liberación y producción que minimiza el retraso")
+    parser.add_argument("--aplicar", action="store_true", help="liberar los pedidos del plan")
+    parser.add_argument("--comprar", action="store_true", help="emitir también las compras sugeridas")
+    parser.add_argument("--intercambios", type=int, default=MAX_INTERCAMBIOS,
+                        help="intercambios evaluados como máximo en la reparación")
+    args = parser.parse_args()
+
+    servicio = ServicioEstado()
+    if args.aplicar or args.comprar:
+        with servicio.transaccion() as sim:
+            inicio = time.monotonic()
+            plan = planificar(sim, args.intercambios)
+            duracion = time.monotonic() - inicio
+            print(aplicar_plan(sim, plan, liberar=args.aplicar, comprar=args.comprar))
+    else:
+        inicio = time.monotonic()
+        plan = planificar(servicio.leer(), args.intercambios)
+        duracion = time.monotonic() - inicio
+
+    print(f"Plan calculado en {duracion:.2f} s para {len(plan['pedidos'])} pedidos")
+    print(f"Retraso total previsto: {plan['retraso_total']} días ({plan['pedidos_retrasados']} pedidos retrasados)")
+    print(f"Liberar hoy: {plan['liberar']}")
+    for c in plan["compras_sugeridas"]:
+        print(f"Comprar {c['quantity']} x material {c['product_id']} al proveedor {c['supplier_id']} "
+              f"(llega {c['expected_arrival']})")
+    if plan["sin_planificar"]:
+        print(f"Sin planificar (sin línea o sin proveedor): {plan['sin_planificar']}")
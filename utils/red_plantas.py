@@ -0,0 +1,307 @@
+import argparse
+import multiprocessing as mp
+from collections import defaultdict
+
+# Simulación de una red de plantas: cada planta corre su propio Simulator en un
+# proceso independiente (y dentro de él sus líneas de producción). Un
+# coordinador sincroniza a todas en cada cierre de día: entrega las
+# transferencias entre plantas que llegan ese día, recoge las que salen y
+# reparte la capacidad de los proveedores compartidos según la demanda neta
+# que cada planta reporta. Los materiales sin proveedor compartido los compra
+# cada planta a sus propios proveedores. Salvo que se desactive, cada planta libera sus
+# pedidos según el planificador antes de producir, como en los escenarios.
+
+
+def _proceso_planta(conexion, planta, semilla, compartidos):
+    # Importaciones dentro del proceso hijo: con "spawn" (Windows) cada proceso
+    # arranca vacío y sólo carga lo que necesita
+    import random
+    from utils.estado import ServicioEstado, ConflictoVersion
+
+    # El estado se guarda con el bloqueo de ServicioEstado y sólo si nadie lo
+    # ha cambiado desde que la planta lo cargó: si el archivo es el del
+    # dashboard, no se pisan las liberaciones o compras hechas durante la
+    # simulación. Sin índice: si hace falta, el dashboard lo reconstruye.
+    servicio = ServicioEstado(planta.config_path, planta.state_path, ruta_indice=None)
+    sim = servicio.leer()
+    sim.daily_capacity = planta.daily_capacity
+    sim.rng = random.Random(semilla)
+    version_base = sim.version
+
+    while True:
+        mensaje, datos = conexion.recv()
+        if mensaje == "dia":
+            conexion.send(_cerrar_dia(sim, compartidos=compartidos, **datos))
+        elif mensaje == "guardar":
+            try:
+                with servicio.transaccion(version_base) as actual:
+                    if actual is not sim:
+                        raise ConflictoVersion(f"{planta.state_path} se ha reescrito durante la simulación")
+                version_base = sim.version
+                conexion.send((True, sim.version))
+            except ConflictoVersion as e:
+                conexion.send((False, str(e)))
+        elif mensaje == "fin":
+            conexion.close()
+            return
+
+
+def _cerrar_dia(sim, entradas, salidas, asignaciones, media, desviacion, tiempo_base_entrega,
+                liberacion_automatica=True, compartidos=frozenset()):
+    from utils.planificador import INTERCAMBIOS_PLAN_DIARIO, planificar, aplicar_plan
+
+    # 1. Transferencias que llegan hoy desde otras plantas
+    for t in entradas:
+        sim.inventory[t["product_id"]] = sim.inventory.get(t["product_id"], 0) + t["quantity"]
+        sim.log_event(
+            event_type="stock",
+            description="Recepción de transferencia entre plantas",
+            product_id=t["product_id"],
+            quantity=t["quantity"],
+            extra={"planta_origen": t["origin_plant_id"]}
+        )
+
+    # 2. Transferencias que salen hoy: se envía lo que haya disponible
+    enviados = []
+    for t in salidas:
+        cantidad = min(t["quantity"], max(0, sim.inventory.get(t["product_id"], 0)))
+        if cantidad == 0:
+            continue
+        sim.inventory[t["product_id"]] -= cantidad
+        sim.log_event(
+            event_type="stock",
+            description="Envío de transferencia entre plantas",
+            product_id=t["product_id"],
+            quantity=cantidad,
+            extra={"planta_destino": t["destination_plant_id"]}
+        )
+        enviados.append(t | {"quantity": cantidad})
+
+    # 3. Compras asignadas por el coordinador a proveedores compartidos
+    proveedores = {s.id: s for s in sim.suppliers}
+    for a in asignaciones:
+        sim.crear_orden_compra(
+            proveedores[a["supplier_id"]], a["product_id"], a["quantity"],
+            "Compra asignada por el coordinador (proveedor compartido)"
+        )
+
+    # 4. Liberación de pedidos según el plan (sin ella sólo se fabricarían
+    #    los pedidos que ya estaban liberados)
+    if liberacion_automatica:
+        aplicar_plan(sim, planificar(sim, intercambios=INTERCAMBIOS_PLAN_DIARIO))
+
+    sim.advance_day(media=media, desviacion=desviacion, tiempo_base_entrega=tiempo_base_entrega)
+
+    # 5. Demanda neta de materiales: faltantes que no están ya en camino. La
+    #    de materiales con proveedor compartido la reparte el coordinador; el
+    #    resto se compra ya al proveedor más rápido de la planta.
+    en_camino = sim.en_camino()
+    demanda = {}
+    locales = {}
+    for s in sim.suppliers:
+        actual = locales.get(s.product_id)
+        if actual is None or s.lead_time < actual.lead_time:
+            locales[s.product_id] = s
+    for pid, cantidad in sim.calcular_faltantes().items():
+        neta = cantidad - en_camino.get(pid, 0)
+        if neta <= 0:
+            continue
+        if pid in compartidos:
+            demanda[pid] = neta
+        elif pid in locales:
+            sim.crear_orden_compra(locales[pid], pid, neta, "Compra a proveedor propio de la planta")
+
+    return {
+        "day": sim.day,
+        "enviados": enviados,
+        "demanda": demanda,
+        "producido": sim.production_log[-1]["produced"] if sim.production_log else {},
+        "pendientes": sum(1 for o in sim.orders if o.status == "pending"),
+        "completados": sum(1 for o in sim.orders if o.status == "completed"),
+    }
+
+
+def repartir_capacidad(demandas, capacidad_proveedores, proveedores):
+    """Reparte la capacidad diaria de los proveedores compartidos entre plantas.
+
+    demandas: {planta_id: {product_id: cantidad}}
+    capacidad_proveedores: {supplier_id: unidades/día}
+    proveedores: {supplier_id: Supplier}
+    Devuelve {planta_id: [{"supplier_id", "product_id", "quantity"}]}. Cada
+    proveedor se reparte en proporción a la demanda (resto mayor), empezando
+    por los de menor lead time.
+    """
+    restante = {pid: dict(d) for pid, d in demandas.items()}
+    asignaciones = defaultdict(list)
+
+    orden = sorted(capacidad_proveedores, key=lambda sid: proveedores[sid].lead_time)
+    for sid in orden:
+        producto = proveedores[sid].product_id
+        capacidad = capacidad_proveedores[sid]
+        pedidos = {planta: d.get(producto, 0) for planta, d in restante.items() if d.get(producto, 0) > 0}
+        total = sum(pedidos.values())
+        if total == 0 or capacidad <= 0:
+            continue
+
+        if total <= capacidad:
+            reparto = pedidos
+        else:
+            cuotas = {planta: capacidad * q / total for planta, q in pedidos.items()}
+            reparto = {planta: int(c) for planta, c in cuotas.items()}
+            sobrante = capacidad - sum(reparto.values())
+            for planta in sorted(cuotas, key=lambda p: cuotas[p] - reparto[p], reverse=True)[:sobrante]:
+                reparto[planta] += 1
+
+        for planta, cantidad in reparto.items():
+            if cantidad > 0:
+                asignaciones[planta].append({"supplier_id": sid, "product_id": producto, "quantity": cantidad})
+                restante[planta][producto] -= cantidad
+
+    return dict(asignaciones)
+
+
+class CoordinadorRed:
+    """Avanza varias plantas en paralelo, un proceso por planta.
+
+    Se usa como gestor de contexto para que los procesos se cierren siempre:
+
+        with CoordinadorRed(plantas, capacidad_proveedores) as red:
+            red.avanzar(30)
+            red.guardar()
+    """
+
+    def __init__(self, plantas, capacidad_proveedores=None, transferencias=None, semilla=None,
+                 liberacion_automatica=True):
+        from utils.loader import cargar_configuracion
+
+        self.plantas = plantas
+        self.capacidad_proveedores = capacidad_proveedores or {}
+        self.semilla = semilla
+        self.liberacion_automatica = liberacion_automatica
+        self.dia = 0
+        self._transferencias = list(transferencias or [])
+        self._en_transito = defaultdict(list)  # día de llegada -> [transferencia]
+        self._asignaciones = {}
+        self._conexiones = {}
+        self._procesos = []
+
+        # Proveedores de todas las plantas (los compartidos tienen el mismo id)
+        self.proveedores = {}
+        for planta in plantas:
+            _, _, suppliers = cargar_configuracion(planta.config_path)
+            self.proveedores.update({s.id: s for s in suppliers})
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def iniciar(self):
+        # Materiales cuya compra reparte el coordinador
+        compartidos = frozenset(self.proveedores[sid].product_id for sid in self.capacidad_proveedores)
+        for i, planta in enumerate(self.plantas):
+            semilla = None if self.semilla is None else self.semilla + i
+            extremo_padre, extremo_hijo = mp.Pipe()
+            proceso = mp.Process(
+                target=_proceso_planta, args=(extremo_hijo, planta, semilla, compartidos),
+                name=f"planta-{planta.id}", daemon=True
+            )
+            proceso.start()
+            self._conexiones[planta.id] = extremo_padre
+            self._procesos.append(proceso)
+
+    def programar_transferencia(self, transferencia):
+        self._transferencias.append(transferencia)
+
+    def avanzar(self, dias=1, media=5, desviacion=2, tiempo_base_entrega=3):
+        """Avanza la red `dias` días y devuelve el resumen de cada día por planta."""
+        resumenes = []
+        for _ in range(dias):
+            self.dia += 1
+            llegadas = self._en_transito.pop(self.dia, [])
+
+            salen = [t for t in self._transferencias if t.day is None or t.day <= self.dia]
+            self._transferencias = [t for t in self._transferencias if t not in salen]
+
+            # Todas las plantas simulan el día a la vez...
+            for planta in self.plantas:
+                self._conexiones[planta.id].send(("dia", {
+                    "entradas": [t for t in llegadas if t["destination_plant_id"] == planta.id],
+                    "salidas": [t.dict() for t in salen if t.origin_plant_id == planta.id],
+                    "asignaciones": self._asignaciones.get(planta.id, []),
+                    "media": media,
+                    "desviacion": desviacion,
+                    "tiempo_base_entrega": tiempo_base_entrega,
+                    "liberacion_automatica": self.liberacion_automatica,
+                }))
+
+            # ...y en el cierre se intercambian transferencias y asignaciones
+            respuestas = {planta.id: self._conexiones[planta.id].recv() for planta in self.plantas}
+            for respuesta in respuestas.values():
+                for t in respuesta["enviados"]:
+                    self._en_transito[self.dia + max(1, t["lead_time"])].append(t)
+
+            self._asignaciones = repartir_capacidad(
+                {pid: r["demanda"] for pid, r in respuestas.items()},
+                self.capacidad_proveedores, self.proveedores
+            )
+            resumenes.append({"dia": self.dia, "plantas": respuestas})
+        return resumenes
+
+    def guardar(self):
+        """Guarda el estado de cada planta y devuelve {planta_id: versión}.
+
+        Lanza ConflictoVersion si el estado de alguna planta cambió en disco
+        durante la simulación; esas plantas no se guardan.
+        """
+        from utils.estado import ConflictoVersion
+
+        for conexion in self._conexiones.values():
+            conexion.send(("guardar", None))
+        respuestas = {pid: conexion.recv() for pid, conexion in self._conexiones.items()}
+        conflictos = [f"planta {pid}: {detalle}" for pid, (ok, detalle) in respuestas.items() if not ok]
+        if conflictos:
+            raise ConflictoVersion("; ".join(conflictos))
+        return {pid: version for pid, (_, version) in respuestas.items()}
+
+    def cerrar(self):
+        for conexion in self._conexiones.values():
+            try:
+                conexion.send(("fin", None))
+            except (BrokenPipeError, OSError):
+                pass  # el proceso de la planta ya terminó (p. ej. por un error)
+        for proceso in self._procesos:
+            proceso.join()
+        self._conexiones = {}
+        self._procesos = []
+
+
+if __name__ == "__main__":
+    from utils.loader import cargar_red
+
+    parser = argparse.ArgumentParser(description="Simula una red de plantas en paralelo")
+    parser.add_argument("red", nargs="?", default="data/red.json")
+    parser.add_argument("--dias", type=int, default=1)
+    parser.add_argument("--semilla", type=int, default=None)
+    parser.add_argument("--guardar", action="store_true", help="guardar el estado de cada planta al terminar")
+    parser.add_argument("--sin-liberacion-automatica", action="store_true",
+                        help="no liberar pedidos: sólo se fabrican los ya liberados")
+    args = parser.parse_args()
+
+    plantas, capacidad_proveedores, transferencias = cargar_red(args.red)
+    nombres = {p.id: p.name for p in plantas}
+    from utils.estado import ConflictoVersion
+
+    with CoordinadorRed(plantas, capacidad_proveedores, transferencias, args.semilla,
+                        not args.sin_liberacion_automatica) as red:
+        resumenes = red.avanzar(args.dias)
+        if args.guardar:
+            try:
+                red.guardar()
+            except ConflictoVersion as e:
+                print(f"No se ha guardado el estado: {e}")
+
+    for pid, r in resumenes[-1]["plantas"].items():
+        print(f"{nombres[pid]}: día {r['day']}, {r['completados']} pedidos completados, {r['pendientes']} pendientes")
@@ -0,0 +1,175 @@
+import os
+import queue
+import threading
+import time
+from utils.estado import ESTADO_FILE, ConflictoVersion, ServicioEstado
+
+# Durante un avance largo el estado se guarda como mucho cada INTERVALO_GUARDADO
+# segundos (y siempre al terminar), para que la interfaz vea el progreso sin que
+# la escritura de estado.json domine el tiempo de simulación. Entre tramos se
+# libera el bloqueo para que otros usuarios puedan registrar sus cambios.
+INTERVALO_GUARDADO = 1.0
+
+
+class SimulationWorker:
+    """Hilo en segundo plano que aplica los comandos sobre el estado de simulación.
+
+    La interfaz no modifica el estado directamente: envía comandos a la cola
+    ("avanzar", "liberar", "comprar", "importar", "planificar", "escenario")
+    y consulta progreso() para saber qué se está ejecutando y qué versión del
+    estado se ha publicado. Cada comando que modifica el estado se aplica
+    dentro de una transacción de ServicioEstado, así que varios procesos con
+    su propio worker no se pisan los cambios.
+    """
+
+    def __init__(self, ruta_config="data/configuracion.json", ruta_estado=ESTADO_FILE):
+        self.servicio = ServicioEstado(ruta_config, ruta_estado)
+        self.cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._progreso = {
+            "ocupado": False,
+            "comando": None,
+            "dias_completados": 0,
+            "dias_totales": 0,
+            "version": None,
+            "error": None,
+        }
+        self._hilo = threading.Thread(target=self._bucle, name="simulation-worker", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def enviar(self, tipo, **params):
+        """Encola un comando y lo devuelve; comando["hecho"] se activa al terminar."""
+        comando = {
+            "tipo": tipo,
+            "params": params,
+            "hecho": threading.Event(),
+            "resultado": None,
+            "error": None,
+        }
+        self.cola.put(comando)
+        return comando
+
+    def progreso(self):
+        with self._lock:
+            progreso = dict(self._progreso)
+        progreso["pendientes"] = self.cola.qsize()
+        return progreso
+
+    # ===== Ejecución =====
+    def _publicar(self, **cambios):
+        with self._lock:
+            self._progreso.update(cambios)
+
+    def _bucle(self):
+        while True:
+            comando = self.cola.get()
+            self._ejecutar(comando)
+
+    def _ejecutar(self, comando):
+        params = comando["params"]
+        self._publicar(
+            ocupado=True,
+            comando=comando["tipo"],
+            dias_completados=0,
+            dias_totales=params.get("dias", 0),
+            error=None
+        )
+        try:
+            manejador = getattr(self, f"_cmd_{comando['tipo']}")
+            comando["resultado"] = manejador(**params)
+        except Exception as e:
+            comando["error"] = str(e)
+            self._publicar(error=f"{comando['tipo']}: {e}")
+        finally:
+            self._publicar(ocupado=False)
+            comando["hecho"].set()
+
+    # ===== Comandos =====
+    def _cmd_avanzar(self, dias=1, media=5, desviacion=2, tiempo_base_entrega=3, capacidad=None, dia_base=None):
+        # Dos usuarios que pulsan "Avanzar" a la vez no deben avanzar el doble:
+        # si otro ya avanzó desde el día que vio este usuario, se rechaza. Las
+        # compras o liberaciones de otros sí se fusionan.
+        dia = 0
+        while dia < dias:
+            with self.servicio.transaccion() as sim:
+                if dia == 0 and dia_base is not None and sim.day != dia_base:
+                    raise ConflictoVersion(f"otro usuario ya avanzó la simulación (día {dia_base} → {sim.day})")
+                if capacidad is not None:
+                    sim.daily_capacity = capacidad
+
+                inicio_tramo = time.monotonic()
+                while dia < dias and time.monotonic() - inicio_tramo < INTERVALO_GUARDADO:
+                    sim.advance_day(media=media, desviacion=desviacion, tiempo_base_entrega=tiempo_base_entrega)
+                    dia += 1
+                    self._publicar(dias_completados=dia)
+            self._publicar(version=sim.version)
+        return sim.day
+
+    def _cmd_liberar(self, order_id):
+        # Se fusiona con cambios ajenos: basta con que el pedido siga pendiente
+        with self.servicio.transaccion() as sim:
+            if not sim.liberar_pedido(order_id):
+                raise ValueError(f"El pedido #{order_id} ya no está pendiente")
+        self._publicar(version=sim.version)
+        return order_id
+
+    def _cmd_comprar(self, compras, version_base=None):
+        # compras: [{"supplier_id", "product_id", "quantity", "descripcion", "extra"}]
+        # Las cantidades se calcularon sobre la versión que vio el usuario: si
+        # el estado cambió desde entonces, se rechaza para no comprar de más.
+        creadas = []
+        with self.servicio.transaccion(version_base) as sim:
+            proveedores = {s.id: s for s in sim.suppliers}
+            for compra in compras:
+                proveedor = proveedores.get(compra["supplier_id"])
+                if proveedor is None:
+                    raise ValueError(f"Proveedor desconocido: {compra['supplier_id']}")
+                po = sim.crear_orden_compra(
+                    proveedor, compra["product_id"], compra["quantity"],
+                    compra["descripcion"], compra.get("extra")
+                )
+                creadas.append(po.id)
+        self._publicar(version=sim.version)
+        return creadas
+
+    def _cmd_importar(self, tipo, ruta, temporal=False):
+        # tipo: "pedidos" o "compras". Con temporal=True el archivo (subido desde
+        # la interfaz) se borra al terminar.
+        from utils.importador import importar_pedidos, importar_ordenes_compra
+
+        importar = importar_pedidos if tipo == "pedidos" else importar_ordenes_compra
+        try:
+            resumen = importar(ruta, servicio=self.servicio)
+        finally:
+            if temporal:
+                os.remove(ruta)
+        self._publicar(version=resumen["version"])
+        return resumen
+
+    def _cmd_planificar(self, liberar=True, comprar=False, version_base=None, capacidad=None):
+        # El plan se recalcula sobre el estado más reciente, así que liberar se
+        # fusiona con cambios ajenos; las compras sugeridas, como en "comprar",
+        # sólo se emiten si el estado es el que vio el usuario. La capacidad es
+        # la que el usuario tenía elegida al ver el plan.
+        from utils.planificador import planificar, aplicar_plan
+
+        with self.servicio.transaccion(version_base if comprar else None) as sim:
+            plan = planificar(sim, capacidad=capacidad)
+            resumen = aplicar_plan(sim, plan, liberar=liberar, comprar=comprar)
+        self._publicar(version=sim.version)
+        return resumen | {"retraso_total": plan["retraso_total"], "pedidos_retrasados": plan["pedidos_retrasados"]}
+
+    def _cmd_escenario(self, dias, **params):
+        # Simula sobre una copia: estado.json sólo se lee (sin bloqueo, el
+        # guardado es atómico) y no se publica ninguna versión nueva
+        from utils.escenarios import ejecutar_escenario
+
+        resultado = ejecutar_escenario(
+            dias, ruta_config=self.servicio.ruta_config, ruta_estado=self.servicio.ruta_estado,
+            progreso=lambda dia: self._publicar(dias_completados=dia), **params
+        )
+        # El estado final no hace falta en la interfaz
+        return {clave: valor for clave, valor in resultado.items() if clave != "estado"}